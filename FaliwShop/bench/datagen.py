@@ -0,0 +1,66 @@
+import base64
+import random
+from datetime import datetime, timedelta
+from io import BytesIO
+
+import pandas as pd
+from PIL import Image
+
+BRANDS = ["Nike", "Adidas", "Polo", "Uniqlo", "Levi's", "Carhartt", "Champion", "Supreme",
+          "Vintage", "เสื้อวง", "มือสองญี่ปุ่น", "General"]
+WORDS = ["Jacket", "Hoodie", "Tee", "Shirt", "Rainbow", "Anti Social", "Nintendo", "Logo",
+         "เสื้อ", "แจ็คเก็ต", "ลายการ์ตูน", "สีดำ", "สีขาว", "โอเวอร์ไซซ์"]
+
+
+# --- 🧪 ข้อมูลปลอมสำหรับ benchmark ---
+def make_image_pool(count=20, size=300, seed=0):
+    """รูป JPEG แบบ data URI ขนาดใกล้ของจริง (ย่อ 300px, q80) ใช้วนซ้ำตอนสร้างสินค้า"""
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(count):
+        img = Image.effect_noise((size, size), rng.randint(20, 80)).convert('RGB')
+        img = Image.blend(img, Image.new('RGB', (size, size), tuple(rng.randint(0, 255) for _ in range(3))), 0.6)
+        buf = BytesIO()
+        img.save(buf, format="JPEG", quality=80)
+        pool.append("data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode())
+    return pool
+
+
+def make_products(n, sold_ratio=0.4, images='base64', days=730, seed=0):
+    rng = random.Random(seed)
+    pool = make_image_pool(seed=seed) if images == 'base64' else []
+    start = datetime.now() - timedelta(days=days)
+    rows = []
+    for i in range(n):
+        cost = rng.choice([50, 80, 100, 150, 200, 300])
+        sell = cost * rng.choice([2, 2.5, 3, 4])
+        sold = rng.random() < sold_ratio
+        listed = start + timedelta(seconds=rng.randint(0, days * 86400))
+        remaining = int((datetime.now() - listed).total_seconds())
+        rows.append({
+            'product_id': f"P{i:06d}",
+            'name': f"{rng.choice(WORDS)} {rng.choice(WORDS)} #{i}",
+            'category': rng.choice(BRANDS),
+            'image_path': None,
+            'image_base64': pool[i % len(pool)] if pool else None,
+            'sell_price': sell,
+            'discount_price': sell * 0.8,
+            'cost_price': cost,
+            'status': 'Sold' if sold else 'Available',
+            'actual_sold_price': sell * rng.choice([0.8, 0.9, 1.0]) if sold else 0,
+            'sold_date': str(listed + timedelta(seconds=rng.randint(0, remaining))) if sold else None,
+            'listed_date': str(listed),
+        })
+    return pd.DataFrame(rows)
+
+
+def make_transactions(n, days=730, seed=0):
+    rng = random.Random(seed + 1)
+    start = datetime.now().date() - timedelta(days=days)
+    rows = [{
+        'date': str(start + timedelta(days=rng.randint(0, days))),
+        'type': rng.choice(["รายจ่าย", "รายรับ"]),
+        'title': rng.choice(["ค่าส่ง", "ค่าเช่าที่", "ซื้อของ", "ขายหน้าร้าน", "ถุง"]),
+        'amount': float(rng.randint(20, 3000)),
+    } for _ in range(n)]
+    return pd.DataFrame(rows).sort_values('date', ignore_index=True)
@@ -0,0 +1,171 @@
+import json
+import threading
+import time
+
+import pandas as pd
+from gspread.utils import a1_to_rowcol
+
+
+class WorksheetNotFound(Exception):
+    pass
+
+
+def payload_bytes(df):
+    # ประมาณขนาด CSV ที่วิ่งผ่าน network (เร็วกว่าเรียก to_csv จริงกับ sheet ที่มีรูป base64)
+    df = pd.DataFrame(df)
+    if df.empty:
+        return 0
+    cells = sum(int(df[c].astype(str).str.len().sum()) for c in df.columns)
+    return cells + len(df) * len(df.columns) + sum(len(str(c)) + 1 for c in df.columns)
+
+
+# --- 📄 GSheetsConnection ปลอม (เก็บใน RAM + นับเวลา/ขนาด payload) ---
+class FakeGSheetsConnection:
+    """แทน `st.connection("gsheets", type=GSheetsConnection)` ตอนรัน benchmark
+
+    รองรับ read / update / create และ `client._open_spreadsheet()` แบบ gspread
+    (row_values, col_values, batch_update, append_rows, deleteDimension) เท่าที่ storage.py ใช้
+    ทุก call ถูกนับจำนวน, bytes ที่รับ/ส่ง และหน่วงเวลาเลียนแบบ network ได้
+    ตั้ง `offline = True` เพื่อให้ทุก call ล้มด้วย ConnectionError (เทสต์ตอนเน็ตหลุด)
+    """
+
+    def __init__(self, sheets=None, latency=0.0, bandwidth=None):
+        self.sheets = {name: df.copy() for name, df in (sheets or {}).items()}
+        self.latency = latency
+        self.bandwidth = bandwidth  # bytes/วินาที (None = ไม่จำกัด)
+        self.stats = {'calls': 0, 'bytes_read': 0, 'bytes_written': 0, 'api_time': 0.0}
+        self.offline = False
+        self._lock = threading.RLock()
+        self.client = _FakeClient(self)
+
+    def _connect(self):
+        if self.offline:
+            raise ConnectionError("offline")
+
+    def _charge(self, read=0, written=0):
+        delay = self.latency
+        if self.bandwidth:
+            delay += (read + written) / self.bandwidth
+        if delay:
+            time.sleep(delay)
+        with self._lock:
+            self.stats['calls'] += 1
+            self.stats['bytes_read'] += read
+            self.stats['bytes_written'] += written
+            self.stats['api_time'] += delay
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {k: 0 for k in self.stats}
+
+    def _sheet(self, worksheet):
+        if worksheet not in self.sheets:
+            raise WorksheetNotFound(worksheet)
+        return self.sheets[worksheet]
+
+    # --- GSheetsConnection API ---
+    def read(self, spreadsheet=None, worksheet=None, ttl=None, **kwargs):
+        self._connect()
+        with self._lock:
+            df = self._sheet(worksheet).copy()
+        self._charge(read=payload_bytes(df))
+        return df
+
+    def update(self, spreadsheet=None, worksheet=None, data=None, **kwargs):
+        self._connect()
+        with self._lock:
+            self._sheet(worksheet)
+            self.sheets[worksheet] = pd.DataFrame(data).reset_index(drop=True)
+        self._charge(written=payload_bytes(data))
+        return data
+
+    def create(self, spreadsheet=None, worksheet=None, data=None, **kwargs):
+        self._connect()
+        with self._lock:
+            self.sheets[worksheet] = pd.DataFrame(data)
+        self._charge(written=payload_bytes(data))
+        return data
+
+
+class _FakeClient:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _open_spreadsheet(self, spreadsheet=None, **kwargs):
+        self.conn._connect()
+        return _FakeSpreadsheet(self.conn)
+
+
+class _FakeSpreadsheet:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def worksheet(self, name):
+        self.conn._sheet(name)
+        return _FakeWorksheet(self, name)
+
+    def add_worksheet(self, title, rows=0, cols=0):
+        with self.conn._lock:
+            self.conn.sheets.setdefault(title, pd.DataFrame())
+        self.conn._charge()
+        return _FakeWorksheet(self, title)
+
+    def batch_update(self, body):
+        with self.conn._lock:
+            for req in body.get('requests', []):
+                rng = req['deleteDimension']['range']
+                name = _FakeWorksheet.names[rng['sheetId']]
+                df = self.conn.sheets[name]
+                # แถวที่ 1 ของ sheet = header -> index ของ DataFrame = startIndex - 1
+                self.conn.sheets[name] = df.drop(df.index[rng['startIndex'] - 1]).reset_index(drop=True)
+        self.conn._charge(written=len(json.dumps(body)))
+
+
+class _FakeWorksheet:
+    names = {}  # sheetId -> ชื่อ worksheet
+
+    def __init__(self, spreadsheet, name):
+        self.spreadsheet = spreadsheet
+        self.conn = spreadsheet.conn
+        self.name = name
+        self.id = abs(hash(name)) % 10 ** 8
+        _FakeWorksheet.names[self.id] = name
+
+    @property
+    def _df(self):
+        return self.conn.sheets[self.name]
+
+    def row_values(self, row):
+        header = [str(c) for c in self._df.columns]
+        self.conn._charge(read=len(",".join(header)))
+        return header
+
+    def col_values(self, col):
+        df = self._df
+        values = [str(df.columns[col - 1])] + ["" if pd.isna(v) else str(v) for v in df.iloc[:, col - 1]]
+        self.conn._charge(read=sum(len(v) + 1 for v in values))
+        return values
+
+    def batch_update(self, data, value_input_option=None):
+        with self.conn._lock:
+            df = self._df
+            for item in data:
+                row, col = a1_to_rowcol(item['range'])
+                value = item['values'][0][0]
+                if row == 1:
+                    if col > len(df.columns):
+                        df[value] = None
+                    continue
+                name = df.columns[col - 1]
+                if df[name].dtype != object:
+                    df[name] = df[name].astype(object)
+                df.iat[row - 2, col - 1] = value
+            self.conn.sheets[self.name] = df
+        self.conn._charge(written=len(json.dumps(data, default=str)))
+
+    def append_rows(self, rows, value_input_option=None):
+        with self.conn._lock:
+            df = self._df
+            new = pd.DataFrame(rows, columns=df.columns)
+            self.conn.sheets[self.name] = pd.concat([df, new], ignore_index=True)
+        self.conn._charge(written=len(json.dumps(rows, default=str)))
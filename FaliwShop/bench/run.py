@@ -0,0 +1,195 @@
+"""Benchmark หน้าเว็บของ shop_app ด้วยข้อมูลปลอม + Google Sheets ปลอม
+
+    python FaliwShop/bench/run.py --products 1000 10000 --transactions 100000
+    python FaliwShop/bench/run.py --products 50000 --latency 0.3 --bandwidth 2000000 --json bench.json
+
+แต่ละ scenario วัด: เวลา rerun, bytes ที่อ่าน/เขียนกับ Sheets ต่อ action และ peak memory
+ค่าเริ่มต้นเปิด write-behind (เหมือนแอปที่ตั้ง [storage] journal ไว้) สถิติของแต่ละ step รวม traffic ตอน flush journal ของ step นั้นด้วย
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import streamlit as st
+import streamlit_option_menu
+from streamlit.testing.v1 import AppTest
+
+from datagen import make_products, make_transactions
+from fake_gsheets import FakeGSheetsConnection
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+APP = os.path.join(APP_DIR, "shop_app.py")
+CURRENT = {'page': "Dashboard"}
+
+# เมนูใน sidebar เป็น custom component ที่ AppTest กดไม่ได้ -> ให้คืนหน้าที่ benchmark เลือกไว้
+streamlit_option_menu.option_menu = lambda *args, **kwargs: CURRENT['page']
+
+# จำ WriteBehindBackend ที่แอปสร้าง -> flush ให้หมดก่อนอ่านสถิติของแต่ละ step
+# (traffic ที่ worker ส่งขึ้น Sheets จะได้นับให้ step ที่ทำให้เกิด ไม่ใช่ step ที่บังเอิญรันอยู่)
+sys.path.insert(0, APP_DIR)
+import sync  # noqa: E402
+
+BACKENDS = []
+_init_write_behind = sync.WriteBehindBackend.__init__
+
+
+def _track(self, *args, **kwargs):
+    _init_write_behind(self, *args, **kwargs)
+    BACKENDS.append(self)
+
+
+sync.WriteBehindBackend.__init__ = _track
+
+
+def _drain():
+    for backend in BACKENDS:
+        backend.flush(force=True)
+
+
+def _button(at, prefix=None, label=None):
+    for b in at.button:
+        if (prefix and b.key and b.key.startswith(prefix)) or (label and b.label == label):
+            return b
+    raise LookupError(prefix or label)
+
+
+# --- ขั้นตอนของแต่ละ scenario: (ชื่อ, หน้า, action) ---
+def _add_entry(at):
+    next(t for t in at.text_input if t.label == "Title").set_value("bench")
+    next(n for n in at.number_input if n.label == "Amount").set_value(123.0)
+    _button(at, label="Add Entry").click()
+
+
+def _search(at):
+    at.text_input[0].set_value("jacket")
+
+
+def _clear_search(at):
+    return at.text_input[0].set_value("")
+
+
+def _sell(at):
+    _button(at, prefix="open_sell_").click().run()
+    _button(at, prefix="b_sell_").click()
+
+
+def _restock(at):
+    _button(at, prefix="restore_").click()
+
+
+STEPS = [
+    ("Dashboard (cold)", "Dashboard", None),
+    ("Dashboard (warm)", "Dashboard", None),
+    ("Transactions", "Transactions", None),
+    ("Transactions: add entry", "Transactions", _add_entry),
+    ("Inventory", "Inventory", None),
+    ("Shop: search", "Inventory", _search),
+    ("Shop: next page", "Inventory", lambda at: (_clear_search(at).run(), _button(at, prefix="next_shop").click())),
+    ("Shop: sell", "Inventory", _sell),
+    ("Sold Items", "Sold Items", None),
+    ("Sold Items: restock", "Sold Items", _restock),
+]
+
+
+def run_scenario(n_products, n_transactions, args):
+    products = make_products(n_products, images=args.images)
+    transactions = make_transactions(n_transactions)
+    conn = FakeGSheetsConnection({'products': products, 'transactions': transactions},
+                                 latency=args.latency, bandwidth=args.bandwidth)
+    st.connection = lambda *a, **k: conn
+    BACKENDS.clear()
+    st.cache_resource.clear()
+    st.cache_data.clear()
+
+    journal = tempfile.mkdtemp(prefix="faliw-bench-")
+    at = AppTest.from_file(APP, default_timeout=args.timeout)
+    at.secrets['credentials'] = {'username': 'bench', 'password': 'bench'}
+    at.secrets['storage'] = {'backend': 'sheets', 'write_behind': args.write_behind,
+                             'journal': os.path.join(journal, "journal.db")}
+    at.secrets['cache'] = {'ttl': args.ttl}
+    at.secrets['history'] = {'path': os.path.join(journal, "history")}
+    at.session_state['logged_in'] = True
+
+    results = []
+    for name, page, action in STEPS:
+        CURRENT['page'] = page
+        _drain()
+        conn.reset_stats()
+        if args.memory:
+            tracemalloc.start()
+        started = time.perf_counter()
+        error = None
+        try:
+            if action is not None:
+                action(at)
+            at.run()
+            if at.exception:
+                error = at.exception[0].value
+        except Exception as e:  # ไม่ให้ scenario เดียวพังทั้งชุด
+            error = f"{type(e).__name__}: {e}"
+        wall = time.perf_counter() - started
+        try:
+            _drain()  # รายการที่ step นี้เขียนลง journal ต้องขึ้น Sheets ก่อนอ่านสถิติ
+        except Exception as e:
+            error = error or f"flush: {type(e).__name__}: {e}"
+        peak = tracemalloc.get_traced_memory()[1] if args.memory else None
+        if args.memory:
+            tracemalloc.stop()
+        results.append({
+            'products': n_products, 'transactions': n_transactions, 'step': name,
+            'wall_s': round(wall, 4), 'api_calls': conn.stats['calls'],
+            'bytes_read': conn.stats['bytes_read'], 'bytes_written': conn.stats['bytes_written'],
+            'peak_mb': round(peak / 2 ** 20, 1) if peak is not None else None, 'error': error,
+        })
+    return results
+
+
+def print_table(rows):
+    header = f"{'products':>8} {'step':<26} {'wall s':>8} {'calls':>5} {'read':>10} {'written':>10} {'peak MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        peak = "-" if r['peak_mb'] is None else f"{r['peak_mb']:.1f}"
+        print(f"{r['products']:>8} {r['step']:<26} {r['wall_s']:>8.3f} {r['api_calls']:>5} "
+              f"{_size(r['bytes_read']):>10} {_size(r['bytes_written']):>10} {peak:>8}"
+              + (f"  !! {r['error']}" if r['error'] else ""))
+
+
+def _size(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--transactions", type=int, default=100000)
+    parser.add_argument("--images", choices=["base64", "none"], default="base64")
+    parser.add_argument("--latency", type=float, default=0.0, help="วินาทีต่อ API call")
+    parser.add_argument("--bandwidth", type=float, default=None, help="bytes/วินาที")
+    parser.add_argument("--ttl", type=float, default=30)
+    parser.add_argument("--no-write-behind", dest="write_behind", action="store_false",
+                        help="ปิด journal + background sync (เหมือนแอปที่ไม่ได้ตั้ง [storage] journal)")
+    parser.add_argument("--no-memory", dest="memory", action="store_false", help="ไม่วัด peak memory (เร็วขึ้น)")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--json", help="เขียนผลลัพธ์เป็น JSON")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for n in args.products:
+        rows += run_scenario(n, args.transactions, args)
+    print_table(rows)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2, ensure_ascii=False)
+    return 1 if any(r['error'] for r in rows) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
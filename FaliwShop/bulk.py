@@ -0,0 +1,149 @@
+import csv
+import io
+import os
+import tempfile
+import zipfile
+from collections import deque
+from datetime import datetime
+from itertools import islice
+
+from images import decode_data_uri
+from schema import dump
+from storage import DuplicateKeyError
+
+NUMBER_FIELDS = ('sell_price', 'discount_price', 'cost_price')
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.webp')
+# ค่าเริ่มต้นของสินค้าใหม่ (ของเดิมจะอัปเดตเฉพาะคอลัมน์ที่ CSV ใส่ค่ามา)
+NEW_ROW = {
+    'category': "General", 'sell_price': 0.0, 'discount_price': 0.0, 'cost_price': 0.0,
+    'status': 'Available', 'actual_sold_price': 0, 'sold_date': None,
+}
+
+
+# --- 📥 Bulk import (CSV + ZIP รูป) ---
+def parse_row(raw, line_no):
+    """ตรวจ 1 แถวจาก CSV -> (row, error)
+
+    row มีเฉพาะคอลัมน์ที่ CSV ใส่ค่ามา (ช่องว่าง = ไม่แก้ของเดิม) ค่า default ของสินค้าใหม่อยู่ใน NEW_ROW
+    """
+    raw = {str(k).strip(): (v or "").strip() for k, v in raw.items() if k}
+    if not raw.get('product_id') or not raw.get('name'):
+        return None, f"line {line_no}: ต้องมี product_id และ name"
+    row = {'product_id': raw['product_id'], 'name': raw['name']}
+    if raw.get('category'):
+        row['category'] = raw['category']
+    for field in NUMBER_FIELDS:
+        if not raw.get(field):
+            continue
+        try:
+            row[field] = float(raw[field])
+        except ValueError:
+            return None, f"line {line_no}: {field} ไม่ใช่ตัวเลข ({raw[field]})"
+    return row, None
+
+
+def image_index(zip_file):
+    """product_id -> ชื่อไฟล์ใน ZIP (ใช้ชื่อไฟล์ไม่รวมนามสกุล เช่น images/TEST01.jpg -> TEST01)"""
+    names = {}
+    for name in zip_file.namelist():
+        stem, ext = os.path.splitext(os.path.basename(name))
+        if stem and ext.lower() in IMAGE_EXTS and not name.startswith('__MACOSX'):
+            names.setdefault(stem, name)
+    return names
+
+
+def import_catalog(backend, pool, csv_file, zip_file=None, batch_size=100, on_progress=None):
+    """อ่าน CSV ทีละก้อน (batch_size แถว) แปลงรูปของก้อนนั้นใน pool แล้ว commit เป็น 1 batch
+
+    รูปที่อ่านจาก ZIP ค้างอยู่ใน pool ได้ไม่เกิน 2 เท่าของจำนวน worker (รูปมือถือไฟล์ละหลาย MB)
+    สินค้าที่ id ซ้ำกับของเดิมจะถูกอัปเดตเฉพาะคอลัมน์ที่ CSV ใส่ค่ามา แทนการเพิ่มใหม่
+    ส่วน id ที่ซ้ำกันเองใน CSV ใช้แค่บรรทัดแรก บรรทัดที่ซ้ำจะขึ้นเป็น error
+    """
+    existing = set(backend.read('products', ['product_id'])['product_id'])
+    seen = set()
+    archive = zipfile.ZipFile(zip_file) if zip_file is not None else None
+    images = image_index(archive) if archive is not None else {}
+    reader = csv.DictReader(io.TextIOWrapper(csv_file, encoding='utf-8-sig', newline=''))
+    result = {'added': 0, 'updated': 0, 'images': 0, 'errors': []}
+    window = 2 * getattr(pool, 'workers', 4)
+
+    line_no = 1
+    while True:
+        chunk = list(islice(reader, batch_size))
+        if not chunk:
+            break
+        rows = []
+        for raw in chunk:
+            line_no += 1
+            row, error = parse_row(raw, line_no)
+            if not error and row['product_id'] in seen:
+                error = f"line {line_no}: product_id {row['product_id']} ซ้ำกับบรรทัดก่อนหน้าใน CSV"
+            if error:
+                result['errors'].append(error)
+            else:
+                seen.add(row['product_id'])
+                rows.append(row)
+
+        pictures, in_flight = {}, deque()
+
+        def settle(pid, job):
+            try:
+                pictures[pid] = job.result()  # {'image_path', 'image_base64'} ตาม pool
+                result['images'] += 1
+            except Exception as e:
+                result['errors'].append(f"{pid}: อ่านรูปไม่ได้ ({e})")
+
+        for row in rows:
+            member = images.get(row['product_id'])
+            if member is None:
+                continue
+            if len(in_flight) >= window:
+                settle(*in_flight.popleft())  # อ่านไฟล์ถัดไปจาก ZIP เมื่อมีช่องว่างใน pool เท่านั้น
+            in_flight.append((row['product_id'], pool.submit(archive.read(member))))
+        while in_flight:
+            settle(*in_flight.popleft())
+
+        for row in rows:
+            row.update(pictures.get(row['product_id'], {}))
+        while rows:
+            try:
+                with backend.batch('products') as b:
+                    for row in rows:
+                        if row['product_id'] in existing:
+                            # ของเดิม: อัปเดตเฉพาะคอลัมน์ที่ CSV ใส่มา ไม่ไปแตะสถานะการขาย
+                            b.update(row['product_id'], row)
+                        else:
+                            b.append(dict(NEW_ROW, **row, listed_date=str(datetime.now())))
+            except DuplicateKeyError as e:
+                # มีคนเพิ่ม id นี้จากอีกเครื่องระหว่าง import -> ไม่ทับของเขา ตัดแถวนั้นออกแล้วเขียนก้อนนี้ใหม่
+                result['errors'] += [f"{pid}: มีสินค้า id นี้อยู่แล้ว (เพิ่งถูกเพิ่มจากที่อื่น) ไม่ได้นำเข้า" for pid in e.ids]
+                rows = [r for r in rows if r['product_id'] not in e.ids]
+                continue
+            added = [r['product_id'] for r in rows if r['product_id'] not in existing]
+            existing.update(added)
+            result['added'] += len(added)
+            result['updated'] += len(rows) - len(added)
+            break
+        if on_progress:
+            on_progress(result)
+    return result
+
+
+# --- 📤 Bulk export (products.csv + transactions.csv + images/) ---
+def export_catalog(backend, store):
+    """สร้าง ZIP ลงไฟล์ชั่วคราว (ไม่ถือทั้งก้อนไว้ใน RAM) แล้วคืน file object ที่ seek(0) แล้ว"""
+    out = tempfile.TemporaryFile()
+    products = backend.read('products')
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('products.csv', dump(products, 'products').drop(columns=['image_base64']).to_csv(index=False))
+        archive.writestr('transactions.csv', dump(backend.read('transactions'), 'transactions').to_csv(index=False))
+        for pid, ref, blob in zip(products['product_id'], products['image_path'], products['image_base64']):
+            path = store.path(ref, 'full')
+            if path:
+                archive.write(path, f"images/{pid}{os.path.splitext(path)[1]}", compress_type=zipfile.ZIP_STORED)
+            elif isinstance(blob, str) and blob.startswith('data:image'):
+                buf = io.BytesIO()
+                decode_data_uri(blob).convert('RGB').save(buf, format='JPEG', quality=90)
+                archive.writestr(f"images/{pid}.jpg", buf.getvalue(), compress_type=zipfile.ZIP_STORED)
+    out.seek(0)
+    return out
@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+from datetime import date
+
+import pandas as pd
+
+from profiling import span
+from schema import coerce
+
+try:
+    import pyarrow  # noqa: F401  (engine ของ to_parquet)
+    PARQUET = True
+except ImportError:
+    PARQUET = False
+
+HISTORY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history")
+
+# ประวัติที่โตขึ้นเรื่อยๆ: (worksheet, คอลัมน์วันที่, status ที่นับ, คอลัมน์ที่เก็บใน snapshot)
+DATASETS = {
+    'transactions': {'worksheet': 'transactions', 'date': 'date', 'status': None,
+                     'columns': ['date', 'type', 'title', 'amount']},
+    'sales': {'worksheet': 'products', 'date': 'sold_date', 'status': 'Sold',
+              'columns': ['sold_date', 'product_id', 'name', 'category', 'actual_sold_price',
+                          'cost_price', 'sell_price', 'discount_price', 'listed_date']},
+}
+
+
+def month_of(value):
+    """'YYYY-MM' ของวันที่ (None ถ้าไม่มีวันที่)"""
+    try:
+        value = pd.Timestamp(value)
+    except (TypeError, ValueError):
+        return None
+    return None if pd.isna(value) else f"{value.year:04d}-{value.month:02d}"
+
+
+def month_bounds(month):
+    """'YYYY-MM' -> (วันแรกของเดือน, วันแรกของเดือนถัดไป)"""
+    year, mon = int(month[:4]), int(month[5:7])
+    return date(year, mon, 1), date(year + mon // 12, mon % 12 + 1, 1)
+
+
+def months_between(start, end):
+    months, month = [], month_of(start)
+    while month <= month_of(end):
+        months.append(month)
+        month = month_of(month_bounds(month)[1])
+    return months
+
+
+def _fingerprint(df):
+    # เทียบว่าเดือนนี้เปลี่ยนไปจาก snapshot เดิมไหม (ไม่ขึ้นกับลำดับแถว)
+    return str(int(pd.util.hash_pandas_object(df, index=False).sum()))
+
+
+def totals(name, df):
+    """ยอดรวมของ 1 ก้อน (ต่อเดือน) ที่เก็บไว้ใน manifest"""
+    if name == 'transactions':
+        amount = df['amount']
+        return {'rows': len(df), 'income': float(amount[df['type'] == 'รายรับ'].sum()),
+                'expense': float(amount[df['type'] == 'รายจ่าย'].sum())}
+    return {'rows': len(df), 'revenue': float(df['actual_sold_price'].sum()),
+            'cost': float(df['cost_price'].sum())}
+
+
+# --- 🗓️ ประวัติแยกรายเดือน: เดือนที่ปิดแล้วเก็บเป็น Parquet, เดือนปัจจุบันอ่านสดจาก backend ---
+class HistoryStore:
+    """snapshot ของ transactions / ของที่ขายแล้ว แบ่งไฟล์ละเดือน
+
+    `<root>/<dataset>/<YYYY-MM>.parquet` + `manifest.json` (version ที่ snapshot ตรงกับ, ยอดรวมต่อเดือน)
+    หน้าเว็บขอช่วงวันที่ -> อ่านเฉพาะไฟล์ของเดือนในช่วงนั้น ส่วนเดือนปัจจุบัน (และเดือนที่เพิ่งถูกแก้)
+    query จาก backend เฉพาะช่วงเดือนนั้น งานปกติเลยขึ้นกับขนาดเดือนนี้ ไม่ใช่ประวัติทั้งหมด
+
+    ทำ snapshot ใหม่ทั้งชุดเฉพาะตอน version ไม่ตรง (แก้ใน sheet ตรงๆ / เปิดแอปใหม่แล้ว version เปลี่ยน)
+    การเขียนจากแอปเอง (listener) แค่ mark เดือนที่โดนแก้ให้ freeze ใหม่
+    manifest เก็บ `durable_version` ของ backend (version ของ write-behind ใช้ได้แค่ใน process เดียว)
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._manifest = {name: self._load_manifest(name) for name in DATASETS}
+        self.versions = {name: None for name in DATASETS}  # version ใน process นี้ (เปิดแอปใหม่เทียบด้วย manifest)
+        self._dirty = {name: set() for name in DATASETS}
+        self._sold_month = None  # product_id -> เดือนที่ขาย (ไว้รู้ว่าแก้/คืนของแล้วเดือนไหนเปลี่ยน)
+
+    # --- files ---
+    def _path(self, name, month=None):
+        return os.path.join(self.root, name, f"{month}.parquet" if month else "manifest.json")
+
+    def _load_manifest(self, name):
+        try:
+            with open(self._path(name)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'version': None, 'through': None, 'months': {}}
+
+    def _save_manifest(self, name):
+        path = self._path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(self._manifest[name], f, indent=1)
+        os.replace(f"{path}.tmp", path)
+
+    def _freeze(self, name, month, df):
+        path = self._path(name, month)
+        with span("history.freeze", dataset=name, month=month, rows=len(df)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            df.reset_index(drop=True).to_parquet(f"{path}.tmp", index=False)
+            os.replace(f"{path}.tmp", path)
+        self._manifest[name]['months'][month] = dict(totals(name, df), hash=_fingerprint(df))
+
+    def _drop(self, name, month):
+        self._manifest[name]['months'].pop(month, None)
+        try:
+            os.remove(self._path(name, month))
+        except OSError:
+            pass
+
+    # --- sync / listener ---
+    @staticmethod
+    def _closed():
+        # เดือนล่าสุดที่ปิดแล้ว (เดือนก่อนหน้าเดือนนี้)
+        return month_of(pd.Timestamp(date.today().replace(day=1)) - pd.Timedelta(days=1))
+
+    def _query(self, backend, name, start=None, end=None):
+        spec = DATASETS[name]
+        return backend.between(spec['worksheet'], spec['date'], start, end, status=spec['status'],
+                               columns=spec['columns'])
+
+    def sync(self, backend):
+        if not PARQUET:
+            return self
+        closed = self._closed()
+        for name, spec in DATASETS.items():
+            version = backend.version(spec['worksheet'])
+            durable = backend.durable_version(spec['worksheet'])
+            with self._lock:
+                manifest = self._manifest[name]
+                current = (version is not None and version == self.versions[name]) \
+                    or (durable is not None and durable == manifest.get('version'))
+                if not current or manifest.get('columns') != spec['columns']:
+                    self._rebuild(backend, name, closed)
+                    manifest['columns'] = spec['columns']
+                else:
+                    if name == 'sales' and self._sold_month is None:
+                        sold = backend.between('products', 'sold_date', status='Sold', columns=['product_id', 'sold_date'])
+                        self._sold_month = dict(zip(sold['product_id'], sold['sold_date'].dt.strftime('%Y-%m')))
+                    # เดือนที่เพิ่งปิด (ข้ามเดือนมาแล้ว) + เดือนเก่าที่โดนแก้ -> freeze เฉพาะเดือนนั้น
+                    todo = set(self._dirty[name])
+                    if manifest['through'] and manifest['through'] < closed:
+                        todo.update(months_between(month_bounds(manifest['through'])[1], month_bounds(closed)[0]))
+                    for month in sorted(m for m in todo if m <= closed):
+                        df = self._query(backend, name, *month_bounds(month))
+                        if len(df):
+                            self._freeze(name, month, df)
+                        else:
+                            self._drop(name, month)
+                    manifest['through'] = closed
+                self._dirty[name] = set()
+                self.versions[name] = version
+                manifest['version'] = durable
+                self._save_manifest(name)
+        return self
+
+    def _rebuild(self, backend, name, closed):
+        spec = DATASETS[name]
+        df = self._query(backend, name)
+        with span("history.rebuild", dataset=name, rows=len(df)):
+            months = df[spec['date']].dt.strftime('%Y-%m')
+            if name == 'sales':
+                self._sold_month = dict(zip(df['product_id'], months))
+            old = self._manifest[name]['months']
+            seen = set()
+            for month, part in df[months <= closed].groupby(months[months <= closed], sort=True):
+                seen.add(month)
+                # เขียนไฟล์ใหม่เฉพาะเดือนที่เนื้อหาไม่ตรงของเดิม
+                if old.get(month, {}).get('hash') != _fingerprint(part) or not os.path.exists(self._path(name, month)):
+                    self._freeze(name, month, part)
+            for month in set(old) - seen:
+                self._drop(name, month)
+            self._manifest[name]['through'] = closed
+
+    def on_write(self, worksheet, batch, old_version, new_version):
+        # ใช้เป็น listener ของ Backend.subscribe
+        for name, spec in DATASETS.items():
+            if spec['worksheet'] != worksheet:
+                continue
+            with self._lock:
+                if batch is None or old_version is None or old_version != self.versions[name] \
+                        or (name == 'sales' and self._sold_month is None):
+                    self.versions[name] = None
+                    continue
+                self._dirty[name].update(m for m in self._touched(name, batch) if m)
+                self.versions[name] = new_version
+
+    def _touched(self, name, batch):
+        if name == 'transactions':
+            # key ของ transactions คือ date
+            yield from (month_of(row.get('date')) for row in batch.appends)
+            yield from (month_of(row_id) for row_id in list(batch.updates) + list(batch.deletes))
+            return
+        for row_id in list(batch.updates) + list(batch.deletes):
+            yield self._sold_month.get(row_id)
+            values = batch.updates.get(row_id, {})
+            if row_id in batch.deletes or values.get('status', 'Sold') != 'Sold':
+                self._sold_month.pop(row_id, None)
+            elif values.get('sold_date'):
+                self._sold_month[row_id] = month_of(values['sold_date'])
+                yield self._sold_month[row_id]
+        for row in batch.appends:
+            if row.get('status') == 'Sold':
+                self._sold_month[str(row.get('product_id'))] = month_of(row.get('sold_date'))
+                yield self._sold_month[str(row.get('product_id'))]
+
+    # --- อ่านตามช่วงวันที่ ---
+    def _plan(self, name, start, end):
+        """แบ่งเดือนในช่วงเป็น (เดือนที่ใช้ snapshot ได้, เดือนที่ต้อง query สด)"""
+        with self._lock:
+            manifest = self._manifest[name]
+            usable = PARQUET and self.versions[name] is not None
+            dirty, through = set(self._dirty[name]), manifest['through'] or ""
+            frozen = {m: t for m, t in manifest['months'].items() if m not in dirty} if usable else {}
+        snap, live = {}, []
+        for month in months_between(start, end):
+            if month in frozen:
+                snap[month] = frozen[month]
+            elif not usable or month > through or month in dirty:
+                live.append(month)
+            # นอกนั้น = เดือนที่ปิดแล้วแต่ไม่มีรายการ
+        return snap, live
+
+    def range(self, backend, name, start, end):
+        """แถวของ dataset ที่วันที่อยู่ใน [start, end] (รวมวันสุดท้าย) เรียงจากเก่าไปใหม่"""
+        spec = DATASETS[name]
+        snap, live = self._plan(name, start, end)
+        with span("history.range", dataset=name, partitions=len(snap), live_months=len(live)) as sp:
+            parts = [pd.read_parquet(self._path(name, month)) for month in snap]
+            # เดือนที่ต้อง query สด: รวมเป็นช่วงติดกันเพื่อยิง query ให้น้อยที่สุด
+            for first, last in _runs(live):
+                parts.append(self._query(backend, name, month_bounds(first)[0], month_bounds(last)[1]))
+            df = pd.concat(parts, ignore_index=True) if parts else None
+            df = coerce(df, spec['worksheet'], spec['columns'])
+            day = df[spec['date']]
+            df = df[(day >= pd.Timestamp(start)) & (day < pd.Timestamp(end) + pd.Timedelta(days=1))]
+            sp.set(rows=len(df))
+        return df.sort_values(spec['date'], kind='stable', ignore_index=True)
+
+    def monthly(self, backend, name, start, end):
+        """ยอดรวมรายเดือนในช่วง (เดือนที่ปิดแล้วใช้ค่าใน manifest ไม่ต้องเปิดไฟล์)"""
+        snap, live = self._plan(name, start, end)
+        rows = {month: {k: v for k, v in t.items() if k != 'hash'} for month, t in snap.items()}
+        for month in live:
+            part = self._query(backend, name, *month_bounds(month))
+            if len(part):
+                rows[month] = totals(name, part)
+        return pd.DataFrame.from_dict(dict(sorted(rows.items())), orient='index').rename_axis('month')
+
+
+def _runs(months):
+    """['2024-01', '2024-02', '2024-05'] -> [('2024-01', '2024-02'), ('2024-05', '2024-05')]"""
+    runs = []
+    for month in months:
+        if runs and month_of(month_bounds(runs[-1][1])[1]) == month:
+            runs[-1] = (runs[-1][0], month)
+        else:
+            runs.append((month, month))
+    return runs
@@ -0,0 +1,144 @@
+import base64
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps, features
+
+from profiling import span
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "product_images")
+
+# ขนาดที่ render ไว้ล่วงหน้า (ด้านยาวสุด, quality)
+VARIANTS = {
+    'grid': (400, 80),
+    'full': (1200, 85),
+}
+# นามสกุลไฟล์ -> format ของ Pillow (webp เฉพาะถ้า Pillow build มี)
+FORMATS = {'jpg': 'JPEG'}
+if features.check('webp'):
+    FORMATS['webp'] = 'WEBP'
+REF_PREFIX = "img:"
+
+
+# --- 🖼️ Content-addressed image store ---
+class ImageStore:
+    """เก็บรูปสินค้าบน disk โดยใช้ hash ของเนื้อรูปเป็นชื่อไฟล์
+
+    ใน sheet เก็บแค่ ref สั้นๆ แบบ `img:<hash>` ส่วนไฟล์จริงอยู่ที่
+    `<root>/<hash[:2]>/<hash>_<variant>.<jpg|webp>` (grid สำหรับการ์ด, full สำหรับดูรูปใหญ่)
+    รูปเดียวกันอัปซ้ำกี่ครั้งก็ได้ไฟล์ชุดเดิม
+    """
+
+    def __init__(self, root=IMAGE_DIR):
+        self.root = root
+
+    def _path(self, digest, variant, ext='jpg'):
+        return os.path.join(self.root, digest[:2], f"{digest}_{variant}.{ext}")
+
+    def put(self, pil_img):
+        img = pil_img.convert('RGB')
+        rendered = {}
+        # ย่อจากใหญ่ไปเล็ก: grid ย่อต่อจาก full ไม่ต้องย่อจากรูปต้นฉบับซ้ำ
+        for variant, (size, quality) in sorted(VARIANTS.items(), key=lambda v: -v[1][0]):
+            img = img.copy()
+            img.thumbnail((size, size), reducing_gap=2.0)
+            for ext, fmt in FORMATS.items():
+                buf = BytesIO()
+                img.save(buf, format=fmt, quality=quality)
+                rendered[(variant, ext)] = buf.getvalue()
+
+        digest = hashlib.sha256(rendered[('full', 'jpg')]).hexdigest()[:24]
+        for (variant, ext), data in rendered.items():
+            path = self._path(digest, variant, ext)
+            if os.path.exists(path):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+        return REF_PREFIX + digest
+
+    def path(self, ref, variant='grid', ext='jpg'):
+        """คืน path ของไฟล์รูป (รองรับทั้ง ref `img:` และ path เก่าใน product_images/)"""
+        if not is_ref(ref):
+            return None
+        ref = str(ref)
+        if ref.startswith(REF_PREFIX):
+            path = self._path(ref[len(REF_PREFIX):], variant, ext)
+        else:
+            path = ref if os.path.isabs(ref) else os.path.join(self.root, os.path.basename(ref))
+        return path if os.path.exists(path) else None
+
+
+# --- ⚙️ Ingest: decode เร็ว (draft) + ทำงานใน worker pool ---
+def load_image(fp, max_side=VARIANTS['full'][0]):
+    """เปิดรูปแบบเร็ว: JPEG ให้ libjpeg decode ที่ 1/2, 1/4, 1/8 เท่าที่ยังใหญ่กว่า max_side แล้วหมุนตาม EXIF"""
+    img = Image.open(fp)
+    if img.format == 'JPEG':
+        img.draft('RGB', (max_side, max_side))
+    return ImageOps.exif_transpose(img)
+
+
+def preview_image(data, size=200):
+    with span("images.preview", bytes=len(data)):
+        img = load_image(BytesIO(data), max_side=size)
+        img.thumbnail((size, size))
+    return img
+
+
+class IngestPool:
+    """รับไฟล์ที่อัปโหลด (bytes) แล้ว decode + render ลง ImageStore ใน thread pool
+
+    `submit` คืน Future ของค่าคอลัมน์รูป {'image_path': ref, 'image_base64': ...} ทันที หน้าเว็บไม่ต้องรอ decode รูป 4 MB
+    inline=True (store ไม่ได้อยู่บน disk ถาวร) -> เก็บรูปย่อแบบ data URI ลง sheet ด้วย ไฟล์หายตอน restart รูปก็ยังอยู่
+    Pillow ปล่อย GIL ตอน decode/encode เลยใช้ thread ได้
+    """
+
+    def __init__(self, store, workers=4, inline=False):
+        self.store = store
+        self.workers = workers
+        self.inline = inline
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+
+    def _ingest(self, data):
+        img = load_image(BytesIO(data))
+        return {'image_path': self.store.put(img), 'image_base64': to_data_uri(img) if self.inline else ''}
+
+    def submit(self, data):
+        return self.executor.submit(self._ingest, data)
+
+
+def is_ref(value):
+    return isinstance(value, str) and value.strip() != "" and not value.startswith('data:image')
+
+
+def to_data_uri(pil_img, size=300, quality=80):
+    # รูปย่อแบบเดียวกับที่แอปเก็บลง sheet มาตั้งแต่แรก (300px, q80 ไม่เกินขนาด cell ของ Sheets)
+    img = pil_img.convert('RGB')
+    img.thumbnail((size, size))
+    buf = BytesIO()
+    img.save(buf, format="JPEG", quality=quality)
+    return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode()
+
+
+def decode_data_uri(value):
+    header, _, payload = str(value).partition(',')
+    return Image.open(BytesIO(base64.b64decode(payload)))
+
+
+def migrate_base64(df, store):
+    """ย้ายรูป base64 ออกจาก sheet -> คืน {product_id: {'image_path': ref, 'image_base64': ''}}"""
+    if 'image_base64' not in df.columns:
+        return {}
+    changes = {}
+    blobs = df[df['image_base64'].astype(str).str.startswith('data:image')]
+    for pid, blob in zip(blobs['product_id'], blobs['image_base64']):
+        try:
+            ref = store.put(decode_data_uri(blob))
+        except Exception:
+            continue
+        changes[str(pid)] = {'image_path': ref, 'image_base64': ''}
+    return changes
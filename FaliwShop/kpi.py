@@ -0,0 +1,170 @@
+import threading
+from collections import Counter, defaultdict
+from datetime import date
+
+import pandas as pd
+
+from profiling import span
+from schema import PAGE_COLUMNS
+
+
+def _num(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.0 if value != value else value  # NaN -> 0
+
+
+def _day(value):
+    if isinstance(value, pd.Timestamp):  # โหลดผ่าน schema มาแล้ว
+        return value.date()
+    if value is None or value != value or str(value).strip() in ("", "None"):
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        try:
+            return pd.to_datetime(value).date()
+        except (ValueError, TypeError):
+            return None
+
+
+# --- 📊 KPI ของหน้า Dashboard (อัปเดตทีละแถว) ---
+class ShopKPIs:
+    """ตัวเลขและกราฟของ Dashboard ที่ถูกบวก/ลบทีละแถวตอนขาย/คืน/เพิ่ม/แก้/ลงบัญชี
+
+    คำนวณใหม่ทั้งหมดเฉพาะตอน version ของ worksheet ไม่ตรงกับที่เก็บไว้
+    (เช่น มีคนแก้ใน Google Sheet ตรงๆ หรือ session อื่นเขียนก่อน)
+    """
+
+    COLUMNS = {'products': PAGE_COLUMNS['kpi'], 'transactions': PAGE_COLUMNS['cashflow']}
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.versions = {'products': None, 'transactions': None}
+        self._reset_products()
+        self._reset_transactions()
+
+    def _reset_products(self):
+        self._rows = {}  # product_id -> dict ของค่าที่ใช้คำนวณ
+        self.sold_count = 0
+        self.sold_revenue = 0.0
+        self.sold_cost = 0.0
+        self.stock_cost = 0.0
+        self.stock_sell = 0.0
+        self.total_investment = 0.0
+        self.stock_by_cat = Counter()
+        self.daily = defaultdict(float)
+
+    def _reset_transactions(self):
+        self.income = 0.0
+        self.expense = 0.0
+
+    # --- sync / listener ---
+    def sync(self, backend):
+        for worksheet in self.versions:
+            version = backend.version(worksheet)
+            if version is not None and version == self.versions[worksheet]:
+                continue
+            df = backend.read(worksheet, self.COLUMNS[worksheet])
+            with span("kpi.rebuild", worksheet=worksheet, rows=len(df)), self._lock:
+                if worksheet == 'products':
+                    self._reset_products()
+                    for row in df.to_dict('records'):
+                        self._add_product(str(row['product_id']), row)
+                else:
+                    self._reset_transactions()
+                    for kind, amount in zip(df['type'], df['amount']):
+                        self._add_transaction(kind, amount)
+                self.versions[worksheet] = version
+        return self
+
+    def on_write(self, worksheet, batch, old_version, new_version):
+        if worksheet not in self.versions:
+            return
+        with self._lock:
+            if batch is None or old_version is None or old_version != self.versions[worksheet]:
+                self.versions[worksheet] = None
+                return
+            if worksheet == 'transactions':
+                if batch.updates or batch.deletes:
+                    self.versions[worksheet] = None
+                    return
+                for row in batch.appends:
+                    self._add_transaction(row.get('type'), row.get('amount'))
+            else:
+                for row_id in batch.deletes:
+                    self._remove_product(row_id)
+                for row_id, values in batch.updates.items():
+                    if row_id in self._rows:
+                        row = dict(self._rows[row_id], **values)
+                        self._remove_product(row_id)
+                        self._add_product(row_id, row)
+                for row in batch.appends:
+                    row_id = str(row.get('product_id'))
+                    self._remove_product(row_id)
+                    self._add_product(row_id, row)
+            self.versions[worksheet] = new_version
+
+    # --- บวก / ลบ ทีละแถว ---
+    def _add_transaction(self, kind, amount, sign=1):
+        if kind == 'รายรับ':
+            self.income += sign * _num(amount)
+        elif kind == 'รายจ่าย':
+            self.expense += sign * _num(amount)
+
+    def _apply_product(self, row, sign):
+        cost = _num(row.get('cost_price'))
+        self.total_investment += sign * cost
+        if row.get('status') == 'Sold':
+            self.sold_count += sign
+            self.sold_revenue += sign * _num(row.get('actual_sold_price'))
+            self.sold_cost += sign * cost
+            day = _day(row.get('sold_date'))
+            if day is not None:
+                self.daily[day] += sign * _num(row.get('actual_sold_price'))
+                if sign < 0 and abs(self.daily[day]) < 1e-9:
+                    del self.daily[day]
+        elif row.get('status') == 'Available':
+            self.stock_cost += sign * cost
+            self.stock_sell += sign * _num(row.get('sell_price'))
+            cat = str(row.get('category'))
+            self.stock_by_cat[cat] += sign
+            if self.stock_by_cat[cat] <= 0:
+                del self.stock_by_cat[cat]
+
+    def _add_product(self, row_id, row):
+        keep = ('status', 'category', 'cost_price', 'sell_price', 'actual_sold_price', 'sold_date')
+        row = {k: row.get(k) for k in keep}
+        self._rows[row_id] = row
+        self._apply_product(row, 1)
+
+    def _remove_product(self, row_id):
+        row = self._rows.pop(row_id, None)
+        if row is not None:
+            self._apply_product(row, -1)
+
+    # --- ค่าที่หน้า Dashboard ใช้ ---
+    @property
+    def realized_profit(self):
+        return self.sold_revenue - self.sold_cost
+
+    @property
+    def potential_profit(self):
+        return self.stock_sell - self.stock_cost
+
+    @property
+    def net_cash(self):
+        return (self.income + self.sold_revenue) - (self.expense + self.total_investment)
+
+    def stock_series(self):
+        with self._lock:
+            return pd.Series(dict(self.stock_by_cat.most_common()), name='count', dtype='int64')
+
+    def daily_sales(self, start=None, end=None):
+        """ยอดขายรายวันในช่วง [start, end] (รวมวันสุดท้าย) จาก series ที่อัปเดตทีละแถวอยู่แล้ว"""
+        with self._lock:
+            days = {day: total for day, total in self.daily.items()
+                    if (start is None or day >= start) and (end is None or day <= end)}
+        return pd.Series(days, name='actual_sold_price', dtype='float64').sort_index()
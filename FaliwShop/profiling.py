@@ -0,0 +1,127 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+
+_local = threading.local()
+
+
+# --- ⏱️ จับเวลาต่อ rerun (ปิดอยู่ = แทบไม่มี overhead) ---
+class _NoSpan:
+    enabled = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **attrs):
+        pass
+
+
+NOOP = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('rerun', 'name', 'attrs', 'start', 'depth')
+    enabled = True
+
+    def __init__(self, rerun, name, attrs):
+        self.rerun, self.name, self.attrs = rerun, name, attrs
+
+    def __enter__(self):
+        self.depth = self.rerun.depth
+        self.rerun.depth += 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.perf_counter()
+        self.rerun.depth -= 1
+        if exc_type is not None:
+            self.attrs['error'] = exc_type.__name__
+        self.rerun.spans.append({
+            'name': self.name, 'start_ms': (self.start - self.rerun.t0) * 1000,
+            'dur_ms': (end - self.start) * 1000, 'depth': self.depth, **self.attrs,
+        })
+        return False
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+
+class Rerun:
+    def __init__(self, label):
+        self.label = label
+        self.started_at = time.time()
+        self.t0 = time.perf_counter()
+        self.spans = []
+        self.depth = 0
+        self.total_ms = None
+        self.thread = threading.get_ident()
+
+    def close(self):
+        if self.total_ms is None:
+            self.total_ms = (time.perf_counter() - self.t0) * 1000
+
+
+def span(name, **attrs):
+    """ใช้แบบ `with span("sheets.read", worksheet=ws) as sp: ...; sp.set(rows=n)`
+
+    ถ้า rerun นี้ไม่ได้เปิด profiler จะคืน NOOP (เช็ค `sp.enabled` ก่อนคำนวณค่าที่แพง)
+    """
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is None:
+        return NOOP
+    return _Span(rerun, name, attrs)
+
+
+def begin(history, label=""):
+    """เริ่มเก็บ rerun ใหม่ของ thread นี้ (rerun ก่อนหน้าที่จบด้วย st.rerun/st.stop จะถูกปิดให้)"""
+    end()
+    rerun = Rerun(label)
+    _local.rerun = rerun
+    _local.history = history
+    history.append(rerun)
+    return rerun
+
+
+def set_label(label):
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is not None:
+        rerun.label = label
+
+
+def end():
+    rerun = getattr(_local, 'rerun', None)
+    if rerun is not None:
+        rerun.close()
+    _local.rerun = None
+
+
+def new_history(size=20):
+    return deque(maxlen=size)
+
+
+# --- export ---
+def to_json(reruns):
+    return json.dumps([{
+        'label': r.label, 'started_at': r.started_at, 'total_ms': r.total_ms, 'spans': r.spans,
+    } for r in reruns], ensure_ascii=False, indent=2, default=str)
+
+
+def to_chrome_trace(reruns):
+    """format ของ chrome://tracing / Perfetto (ph = X คือ complete event, หน่วย µs)"""
+    events = []
+    for r in reruns:
+        base = r.started_at * 1e6
+        events.append({'name': r.label or "rerun", 'ph': 'X', 'ts': base, 'dur': (r.total_ms or 0) * 1000,
+                       'pid': os.getpid(), 'tid': r.thread, 'cat': 'rerun'})
+        for s in r.spans:
+            args = {k: v for k, v in s.items() if k not in ('name', 'start_ms', 'dur_ms', 'depth')}
+            events.append({'name': s['name'], 'ph': 'X', 'ts': base + s['start_ms'] * 1000,
+                           'dur': s['dur_ms'] * 1000, 'pid': os.getpid(), 'tid': r.thread,
+                           'cat': s['name'].split('.')[0], 'args': args})
+    return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'}, default=str)
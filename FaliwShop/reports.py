@@ -0,0 +1,123 @@
+import threading
+from collections import OrderedDict
+from datetime import date
+
+import pandas as pd
+
+from profiling import span
+
+# ช่วงอายุของในสต็อก (วัน) สำหรับรายงาน stock aging
+AGING_BINS = [-1, 7, 30, 90, 180, float('inf')]
+AGING_LABELS = ["0-7", "8-30", "31-90", "91-180", "180+"]
+
+
+def _margin(profit, revenue):
+    return (profit / revenue.where(revenue != 0)).mul(100).round(1)
+
+
+# --- 📈 รายงานวิเคราะห์ (จำผลไว้ต่อ version ของข้อมูล) ---
+class Reports:
+    """รายงานของหน้า Reports คำนวณแบบ vectorized ด้วย pandas
+
+    ผลลัพธ์ถูกจำไว้ตาม (รายงาน, พารามิเตอร์, version ของ worksheet ที่ใช้)
+    สลับไปมาระหว่างรายงานหรือช่วงวันที่เดิมได้ทันที จนกว่าจะมีการขาย/แก้ของ (version เปลี่ยน)
+    รายงานที่ดูย้อนหลังอ่านผ่าน HistoryStore -> เปิดเฉพาะเดือนในช่วงที่เลือก
+    """
+
+    def __init__(self, history, size=64):
+        self.history = history
+        self.size = size
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+
+    def _memo(self, backend, name, worksheets, params, compute):
+        versions = tuple(backend.version(ws) for ws in worksheets)
+        key = (name, params, versions)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        with span("reports.compute", report=name):
+            result = compute()
+        if None not in versions:  # ไม่รู้ version = จำไม่ได้ว่าข้อมูลเปลี่ยนหรือยัง
+            with self._lock:
+                self._cache[key] = result
+                while len(self._cache) > self.size:
+                    self._cache.popitem(last=False)
+        return result
+
+    def _sales(self, backend, start, end):
+        return self.history.sync(backend).range(backend, 'sales', start, end)
+
+    # --- รายงาน ---
+    def monthly_pnl(self, backend, start, end):
+        """กำไรขาดทุนรายเดือน: ยอดขาย - ทุนของที่ขาย + รายรับอื่น - รายจ่าย (จากยอดรวมรายเดือนของ history)"""
+        def compute():
+            history = self.history.sync(backend)
+            sales = history.monthly(backend, 'sales', start, end)
+            trans = history.monthly(backend, 'transactions', start, end)
+            # ช่วงที่ไม่มีรายการเลยได้ frame ไม่มีคอลัมน์ -> ใช้เดือนของทั้งสองฝั่งแล้วเติมคอลัมน์ที่ขาด
+            months = sales.index.union(trans.index)
+            sales = sales.reindex(index=months, columns=['rows', 'revenue', 'cost'])
+            trans = trans.reindex(index=months, columns=['income', 'expense'])
+            df = pd.DataFrame({
+                'sold': sales['rows'], 'revenue': sales['revenue'], 'cogs': sales['cost'],
+                'other_income': trans['income'], 'expense': trans['expense'],
+            }, index=months).fillna(0).sort_index().rename_axis('month')
+            df['gross_profit'] = df['revenue'] - df['cogs']
+            df['margin_pct'] = _margin(df['gross_profit'], df['revenue'])
+            df['net'] = df['gross_profit'] + df['other_income'] - df['expense']
+            return df.astype({'sold': 'int64'})
+        return self._memo(backend, 'monthly_pnl', ('products', 'transactions'), (start, end), compute)
+
+    def category_margins(self, backend, start, end):
+        """กำไร/margin แยกตาม category (แบรนด์) ของที่ขายในช่วง + จำนวนวันเฉลี่ยกว่าจะขายได้"""
+        def compute():
+            sold = self._sales(backend, start, end)
+            sold = sold.assign(profit=sold['actual_sold_price'] - sold['cost_price'],
+                               days_to_sell=(sold['sold_date'] - sold['listed_date']).dt.days)
+            df = sold.groupby('category', observed=True).agg(
+                sold=('product_id', 'size'), revenue=('actual_sold_price', 'sum'), cost=('cost_price', 'sum'),
+                profit=('profit', 'sum'), avg_days_to_sell=('days_to_sell', 'mean'))
+            df['margin_pct'] = _margin(df['profit'], df['revenue'])
+            return df.sort_values('profit', ascending=False).round({'avg_days_to_sell': 1})
+        return self._memo(backend, 'category_margins', ('products',), (start, end), compute)
+
+    def sell_through(self, backend):
+        """อัตราขายออก (sold / ทั้งหมดที่เคยลงขาย) แยก category"""
+        def compute():
+            df = backend.read('products', ['status', 'category'])
+            counts = pd.crosstab(df['category'], df['status']).reindex(columns=['Available', 'Sold'], fill_value=0)
+            counts['total'] = counts['Available'] + counts['Sold']
+            counts['sell_through_pct'] = (counts['Sold'] / counts['total'].where(counts['total'] != 0)).mul(100).round(1)
+            return counts.sort_values('total', ascending=False)
+        return self._memo(backend, 'sell_through', ('products',), (), compute)
+
+    def stock_aging(self, backend):
+        """อายุของที่ยังไม่ขาย (วันนับจาก listed_date) -> (ตารางตามช่วงอายุ, ของที่ค้างนานสุด, จำนวนที่ไม่รู้วันลงขาย)"""
+        today = date.today()
+
+        def compute():
+            df = backend.available_items(columns=['product_id', 'name', 'category', 'cost_price', 'listed_date'])
+            known = df[df['listed_date'].notna()]
+            days = (pd.Timestamp(today) - known['listed_date'].dt.normalize()).dt.days
+            bucket = pd.cut(days, AGING_BINS, labels=AGING_LABELS)
+            table = known.groupby(bucket, observed=False).agg(items=('product_id', 'size'), cost=('cost_price', 'sum'))
+            oldest = known.assign(days_in_stock=days).nlargest(20, 'days_in_stock')
+            return table.rename_axis('days_in_stock'), oldest.drop(columns=['listed_date']), len(df) - len(known)
+        return self._memo(backend, 'stock_aging', ('products',), (today,), compute)
+
+    def price_realization(self, backend, start, end):
+        """ราคาที่ขายได้จริงเทียบราคาตั้ง/ราคา floor แยก category"""
+        def compute():
+            sold = self._sales(backend, start, end)
+            sold = sold.assign(
+                pct_of_list=sold['actual_sold_price'] / sold['sell_price'].where(sold['sell_price'] != 0) * 100,
+                below_floor=sold['actual_sold_price'] < sold['discount_price'],
+                over_floor=sold['actual_sold_price'] - sold['discount_price'])
+            df = sold.groupby('category', observed=True).agg(
+                sold=('product_id', 'size'), avg_pct_of_list=('pct_of_list', 'mean'),
+                below_floor=('below_floor', 'sum'), avg_over_floor=('over_floor', 'mean'))
+            df['below_floor_pct'] = (df['below_floor'] / df['sold'] * 100).round(1)
+            return df.round({'avg_pct_of_list': 1, 'avg_over_floor': 0}).sort_values('sold', ascending=False)
+        return self._memo(backend, 'price_realization', ('products',), (start, end), compute)
@@ -0,0 +1,98 @@
+import pandas as pd
+
+COLUMNS = {
+    'products': ['product_id', 'name', 'category', 'image_path', 'image_base64', 'sell_price',
+                 'discount_price', 'cost_price', 'status', 'actual_sold_price', 'sold_date', 'listed_date',
+                 'row_version', 'entry_id'],
+    'transactions': ['date', 'type', 'title', 'amount', 'entry_id'],
+}
+
+# รหัสของแต่ละแถวที่ได้ตอนสร้าง (append) ใช้กันแถวเบิ้ลตอนส่ง append ซ้ำ (เช่นส่งผ่านแล้วแต่ response หาย)
+# แยกจาก product_id: แถวที่มี product_id ซ้ำแต่ entry_id ไม่ตรง = คนละชิ้น ไม่ใช่การส่งซ้ำ
+ENTRY_ID = 'entry_id'
+# คอลัมน์ที่ห้ามซ้ำกันใน worksheet -> เพิ่มแถวด้วยค่าที่มีอยู่แล้วจะถูกปฏิเสธ (DuplicateKeyError)
+UNIQUE_KEYS = {'products': 'product_id'}
+
+# ชนิดข้อมูลของแต่ละคอลัมน์ในหน่วยความจำ (แปลงครั้งเดียวตอนโหลด ไม่ต้อง float()/to_datetime ซ้ำทุกหน้า)
+#   id       = ข้อความเสมอ (sheet ชอบเดาว่า ID ที่เป็นตัวเลขล้วนเป็น int)
+#   money    = float64 (ค่าว่าง/อ่านไม่ออก = 0)
+#   category = categorical (ค่าซ้ำเยอะ: status, category, type)
+#   datetime = datetime64 (ค่าว่าง = NaT)
+#   version  = int64 เลข version ของแถว เพิ่มทุกครั้งที่แถวถูกแก้ (ค่าว่าง = 0 คือแถวเก่าที่ยังไม่เคยมี version)
+SCHEMA = {
+    'products': {
+        'product_id': 'id', 'category': 'category', 'status': 'category',
+        'sell_price': 'money', 'discount_price': 'money', 'cost_price': 'money', 'actual_sold_price': 'money',
+        'sold_date': 'datetime', 'listed_date': 'datetime', 'row_version': 'version', 'entry_id': 'id',
+    },
+    'transactions': {'date': 'date', 'type': 'category', 'amount': 'money', 'entry_id': 'id'},
+}
+
+# คอลัมน์ที่แต่ละหน้า/ตัวคำนวณใช้ -> หน้าที่ไม่แสดงรูปไม่ต้องลาก image_base64 ไปด้วย
+PAGE_COLUMNS = {
+    'kpi': ['product_id', 'status', 'category', 'cost_price', 'sell_price', 'actual_sold_price', 'sold_date'],
+    'cashflow': ['type', 'amount'],
+    'search': ['product_id', 'name', 'category', 'status'],
+    'images': ['product_id', 'image_base64'],
+}
+
+
+def _coerce_column(s, kind):
+    if kind == 'id':
+        if pd.api.types.is_string_dtype(s):
+            return s
+        return pd.Series([v if pd.isna(v) else _id_text(v) for v in s], index=s.index, dtype=object)
+    if kind == 'money':
+        return pd.to_numeric(s, errors='coerce').fillna(0.0).astype('float64')
+    if kind == 'version':
+        return pd.to_numeric(s, errors='coerce').fillna(0).astype('int64')
+    if kind == 'category':
+        return s if isinstance(s.dtype, pd.CategoricalDtype) else s.astype('category')
+    if kind in ('datetime', 'date'):
+        if pd.api.types.is_datetime64_any_dtype(s):
+            return s
+        s = s.where(s.astype(str).str.strip().ne(''))  # "" จาก sheet = ไม่มีวันที่
+        return pd.to_datetime(s, errors='coerce', format='mixed')
+    return s
+
+
+def _id_text(value):
+    # คอลัมน์ ID ตัวเลขที่มีช่องว่าง sheet ส่งมาเป็น float (1001.0) -> '1001' ให้ตรงกับ col_values ของ sheet
+    return str(int(value)) if isinstance(value, float) and value.is_integer() else str(value)
+
+
+def coerce(df, worksheet, columns=None):
+    """เติมคอลัมน์ที่ขาดแล้วแปลง dtype ตาม SCHEMA (columns = คอลัมน์ที่ต้องมี, ค่า default = ทั้ง worksheet)"""
+    columns = COLUMNS.get(worksheet, []) if columns is None else columns
+    if df is None or df.empty and not len(df.columns):
+        df = pd.DataFrame(columns=columns)
+    for col in columns:
+        if col not in df.columns:
+            df[col] = 'Uncategorized' if col == 'category' else None
+    for col, kind in SCHEMA.get(worksheet, {}).items():
+        if col in df.columns:
+            df[col] = _coerce_column(df[col], kind)
+    return df
+
+
+def project(df, columns=None):
+    return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+
+def dump(df, worksheet):
+    """แปลงกลับเป็นค่าธรรมดาก่อนเขียนลง Sheets / SQLite / CSV (วันที่เป็นข้อความแบบเดิม)"""
+    df = df.copy()
+    for col, kind in SCHEMA.get(worksheet, {}).items():
+        if col not in df.columns:
+            continue
+        s = df[col]
+        if kind in ('date', 'datetime') and pd.api.types.is_datetime64_any_dtype(s):
+            text = (lambda v: v.strftime('%Y-%m-%d')) if kind == 'date' else str
+            df[col] = _plain(s, text)
+        elif kind == 'category':
+            df[col] = _plain(s, str)
+    return df
+
+
+def _plain(s, text):
+    return pd.Series([None if pd.isna(v) else text(v) for v in s], index=s.index, dtype=object)
@@ -0,0 +1,117 @@
+import threading
+import unicodedata
+
+from profiling import span
+from schema import PAGE_COLUMNS
+
+FIELDS = ('product_id', 'name', 'category')
+
+
+def normalize(text):
+    # NFC + casefold + ตัด zero-width ที่ชอบติดมากับข้อความภาษาไทยจากมือถือ
+    text = unicodedata.normalize('NFC', str(text)).casefold()
+    return text.replace('\u200b', '').replace('\ufeff', '').strip()
+
+
+def _present(value):
+    return value is not None and value == value  # value == value ตัด NaN ออก
+
+
+def _grams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+# --- 🔎 Search index ของหน้า Shop ---
+class SearchIndex:
+    """index ของ product_id / name / category สำหรับค้นหาแบบ substring
+
+    ใช้ bigram ของตัวอักษร (ไม่ต้องตัดคำ เลยใช้กับภาษาไทยได้) แล้วเช็ค substring จริง
+    เฉพาะตัวที่ผ่าน bigram ทั้งหมด และเก็บ category -> ids ของที่ยัง Available ไว้ทำ dropdown
+
+    สร้างใหม่ทั้งก้อนเมื่อ version ของ products เปลี่ยน ส่วนการแก้จากในแอปเอง
+    (add / edit / sell / restock) จะอัปเดตทีละแถวผ่าน `on_write`
+    """
+
+    def __init__(self):
+        self.version = None
+        self._lock = threading.Lock()
+        self._rows = {}      # id -> {'text', 'fields'}
+        self._grams = {}     # bigram -> set(ids)
+        self._chars = {}     # ตัวอักษรเดียว -> set(ids) (ไว้ค้นคำยาว 1 ตัว)
+        self._by_cat = {}    # category -> set(ids ที่ Available)
+
+    # --- build / sync ---
+    def sync(self, backend):
+        version = backend.version('products')
+        if version is not None and version == self.version:
+            return self
+        df = backend.read('products', PAGE_COLUMNS['search'])
+        with span("search.rebuild", rows=len(df)), self._lock:
+            self._rows, self._grams, self._chars, self._by_cat = {}, {}, {}, {}
+            cols = [df[c] if c in df.columns else [None] * len(df) for c in FIELDS + ('status',)]
+            for pid, name, category, status in zip(*cols):
+                self._add(str(pid), {'product_id': pid, 'name': name, 'category': category, 'status': status})
+            self.version = version
+        return self
+
+    def on_write(self, worksheet, batch, old_version, new_version):
+        # ใช้เป็น listener ของ Backend.subscribe
+        if worksheet != 'products':
+            return
+        with self._lock:
+            if batch is None or old_version is None or old_version != self.version:
+                self.version = None  # index ตามไม่ทัน -> ไว้ sync ใหม่ทั้งก้อนรอบหน้า
+                return
+            for row_id in batch.deletes:
+                self._remove(row_id)
+            for row_id, values in batch.updates.items():
+                if row_id in self._rows:
+                    fields = dict(self._rows[row_id]['fields'], **values)
+                    self._remove(row_id)
+                    self._add(row_id, fields)
+            for row in batch.appends:
+                self._remove(str(row.get('product_id')))
+                self._add(str(row.get('product_id')), row)
+            self.version = new_version
+
+    def _add(self, pid, fields):
+        fields = {k: fields.get(k) for k in FIELDS + ('status',)}
+        text = "\x00".join(normalize(fields[f]) for f in FIELDS if _present(fields[f]))
+        self._rows[pid] = {'text': text, 'fields': fields}
+        for g in _grams(text):
+            self._grams.setdefault(g, set()).add(pid)
+        for ch in set(text):
+            self._chars.setdefault(ch, set()).add(pid)
+        if fields['status'] == 'Available':
+            self._by_cat.setdefault(str(fields['category']), set()).add(pid)
+
+    def _remove(self, pid):
+        row = self._rows.pop(pid, None)
+        if row is None:
+            return
+        for g in _grams(row['text']):
+            self._grams.get(g, set()).discard(pid)
+        for ch in set(row['text']):
+            self._chars.get(ch, set()).discard(pid)
+        ids = self._by_cat.get(str(row['fields']['category']))
+        if ids is not None:
+            ids.discard(pid)
+            if not ids:
+                del self._by_cat[str(row['fields']['category'])]
+
+    # --- lookup ---
+    def search(self, q):
+        """คืน set ของ product_id ที่มี q อยู่ใน id / name / category"""
+        q = normalize(q)
+        with self._lock:
+            if not q:
+                return set(self._rows)
+            if len(q) == 1:
+                return set(self._chars.get(q, ()))
+            postings = sorted((self._grams.get(g, set()) for g in _grams(q)), key=len)
+            candidates = set(postings[0]).intersection(*postings[1:])
+            return {pid for pid in candidates if q in self._rows[pid]['text']}
+
+    def categories(self):
+        with self._lock:
+            return sorted(self._by_cat)
@@ -1,11 +1,7 @@
+import os
+import threading
 import streamlit as st
-import pandas as pd
-import base64
-from io import BytesIO
-from datetime import datetime
-from PIL import Image, ImageOps
-from streamlit_option_menu import option_menu
-from streamlit_gsheets import GSheetsConnection
+from datetime import date, datetime
 
 # --- Setup หน้าเว็บ ---
 st.set_page_config(page_title="HIGHCLASS", layout="wide", page_icon="✨")
@@ -45,18 +41,121 @@ def check_login():
                 
                 if user == correct_user and pwd == correct_pass:
                     st.session_state.logged_in = True
+                    st.session_state.user = user
                     st.toast("Welcome back, Boss! 😎")
                     st.rerun()
                 else:
                     st.error("❌ Access Denied!")
 
+# หน้า login ใช้แค่ streamlit -> ระหว่างรอ user พิมพ์รหัส ให้ import ของหนักๆ รอไว้ใน background
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    def run():
+        import pandas, storage, streamlit_option_menu, streamlit_gsheets  # noqa: F401
+    thread = threading.Thread(target=run, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
 if not st.session_state.logged_in:
+    warm_up()
     check_login()
     st.stop()
 
-# --- 👇 ส่วนจัดการ Google Sheets ---
+# --- 📦 Module ที่ทุกหน้าใช้ (หลัง login เท่านั้น) ส่วนรูป/รายงาน/import-export โหลดเฉพาะหน้าที่ใช้ ---
+import pandas as pd
+from streamlit_option_menu import option_menu
+from schema import COLUMNS, PAGE_COLUMNS
+from storage import DuplicateKeyError, StaleWriteError
+import profiling
+from profiling import span
+
+# --- ⏱️ Profiler: จับเวลาแต่ละ rerun (เปิดใน secrets [profiling] enabled = true, ดูได้เฉพาะ admins) ---
+PROFILING = st.secrets.get("profiling", {})
+is_admin = st.session_state.get('user', st.secrets["credentials"]["username"]) in \
+    PROFILING.get("admins", [st.secrets["credentials"]["username"]])
+if PROFILING.get("enabled", False) and is_admin:
+    profile_history = st.session_state.setdefault('profile_history', profiling.new_history(int(PROFILING.get("history", 20))))
+    profiling.begin(profile_history)
+else:
+    profile_history = None
+    profiling.end()
+
+# --- 👇 ส่วนจัดการ Storage (Google Sheets / SQLite) ---
 SHEET_URL = "https://docs.google.com/spreadsheets/d/1a452nupXAJ_wLEJIE3NOd1bAJTqerphJfqUUhelq1ZY/edit?usp=sharing"
-conn = st.connection("gsheets", type=GSheetsConnection)
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Cache กลางของทั้ง process: ทุก session ใช้ก้อนเดียวกัน (ตั้ง ttl ได้ใน secrets [cache])
+@st.cache_resource
+def get_sheets_backend():
+    from streamlit_gsheets import GSheetsConnection
+    from storage import SheetsBackend
+    conn = st.connection("gsheets", type=GSheetsConnection)
+    ttl = st.secrets.get("cache", {}).get("ttl", 30)
+    return SheetsBackend(conn, SHEET_URL, ttl=float(ttl))
+
+def _app_path(path):
+    return path if os.path.isabs(path) else os.path.join(APP_DIR, path)
+
+# เลือก backend ได้ใน secrets:  [storage] backend = "sqlite" / "sheets", path = "FALIWSHOP.db"
+# Sheets จะเขียนลง journal ในเครื่องก่อนแล้วค่อย sync เฉพาะเมื่อตั้ง [storage] journal ให้ชี้ไปที่ disk ถาวร
+# (container ฟรีล้างโฟลเดอร์ในแอปทุกครั้งที่ restart -> journal ที่ยัง sync ไม่เสร็จจะหาย) ปิดได้ด้วย write_behind = false
+@st.cache_resource
+def get_backend():
+    cfg = st.secrets.get("storage", {})
+    if cfg.get("backend", "sheets") == "sqlite":
+        from storage import SQLiteBackend
+        return SQLiteBackend(_app_path(cfg.get("path", "FALIWSHOP.db")))
+    if cfg.get("journal") and cfg.get("write_behind", True):
+        from sync import WriteBehindBackend
+        return WriteBehindBackend(get_sheets_backend(), _app_path(cfg["journal"]))
+    return get_sheets_backend()
+
+backend = get_backend()
+
+# รูป (Pillow) ใช้แค่หน้า Inventory / Sold Items / Import-Export -> สร้างตอนเรียกครั้งแรก
+# ที่เก็บรูปตั้งได้ใน secrets [images] path (ควรเป็น disk ถาวร container ฟรีจะล้างโฟลเดอร์ในแอปทุกครั้งที่ restart)
+IMAGE_PATH = st.secrets.get("images", {}).get("path")
+
+@st.cache_resource
+def get_image_store():
+    from images import ImageStore
+    return ImageStore(_app_path(IMAGE_PATH)) if IMAGE_PATH else ImageStore()
+
+# worker pool สำหรับแปลงรูปที่อัปโหลด (จำนวน worker ตั้งได้ใน secrets [images] workers)
+@st.cache_resource
+def get_ingest_pool():
+    from images import IngestPool
+    # ไม่มี [images] path = ไฟล์รูปอยู่บน disk ชั่วคราว -> เก็บรูปย่อ base64 ลง sheet ไว้ด้วยเหมือนเดิม
+    return IngestPool(get_image_store(), workers=int(st.secrets.get("images", {}).get("workers", 4)),
+                      inline=not IMAGE_PATH)
+
+# index ค้นหาของหน้า Shop: สร้างครั้งเดียวต่อ version แล้วอัปเดตทีละแถวตอน add/edit/sell
+@st.cache_resource
+def get_search_index():
+    from search import SearchIndex
+    index = SearchIndex()
+    backend.subscribe(index.on_write)
+    return index
+
+@st.cache_resource
+def get_kpis():
+    from kpi import ShopKPIs
+    kpi = ShopKPIs()
+    backend.subscribe(kpi.on_write)
+    return kpi
+
+# ประวัติรายเดือน (เดือนที่ปิดแล้วเก็บเป็น Parquet ใน secrets [history] path)
+@st.cache_resource
+def get_history():
+    from history import HistoryStore
+    history = HistoryStore(_app_path(st.secrets.get("history", {}).get("path", "history")))
+    backend.subscribe(history.on_write)
+    return history
+
+@st.cache_resource
+def get_reports():
+    from reports import Reports
+    return Reports(get_history())
 
 # --- CSS & Theme ---
 st.markdown("""
@@ -72,23 +171,109 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- Helper Functions ---
-def get_data(worksheet_name):
+def get_data(worksheet_name, columns=None):
+    # dtype แปลงไว้แล้วตอนโหลด (schema.py) และอ่านเฉพาะคอลัมน์ที่หน้านั้นใช้
     try:
-        df = conn.read(spreadsheet=SHEET_URL, worksheet=worksheet_name, ttl=0)
-        return df
+        return backend.read(worksheet_name, columns)
     except Exception:
-        return pd.DataFrame()
-
-def save_data(df, worksheet_name):
-    conn.update(spreadsheet=SHEET_URL, worksheet=worksheet_name, data=df)
-
-def image_to_base64(pil_img):
-    pil_img = pil_img.convert('RGB')
-    pil_img.thumbnail((300, 300))
-    buffered = BytesIO()
-    pil_img.save(buffered, format="JPEG", quality=80)
-    img_str = base64.b64encode(buffered.getvalue()).decode()
-    return f"data:image/jpeg;base64,{img_str}"
+        return pd.DataFrame(columns=COLUMNS[worksheet_name] if columns is None else columns)
+
+def edit_rows(worksheet_name, key='product_id'):
+    # ส่งเฉพาะแถวที่เปลี่ยน: with edit_rows("products") as b: b.update(pid, {...}, expect=row.row_version) / b.append(row) / b.delete(pid)
+    # expect = row_version ที่เห็นตอนเปิดฟอร์ม ถ้าเครื่องอื่นแก้ไปก่อนจะได้ StaleWriteError แทนการเขียนทับ
+    return backend.batch(worksheet_name, key=key)
+
+def date_range(key, months=1):
+    # ช่วงวันที่ของหน้าประวัติ: ค่าเริ่มต้น = ต้นเดือนของ (months - 1) เดือนก่อน ถึงวันนี้
+    today = date.today()
+    first = (pd.Timestamp(today.replace(day=1)) - pd.DateOffset(months=months - 1)).date()
+    picked = st.date_input("📅 Date range", (first, today), key=key, format="YYYY-MM-DD")
+    return picked[0], picked[-1]  # ระหว่างเลือกจะได้มาแค่วันเดียว
+
+INGEST_KEEP = 64  # จำนวน job ล่าสุดที่จำไว้ต่อ session (ไฟล์ที่ยังค้างใน uploader ไม่ต้องแปลงซ้ำ)
+
+def ingest_upload(uploaded):
+    # เริ่มแปลงรูปใน background ทันทีที่อัปโหลด (ครั้งเดียวต่อไฟล์) -> คืน Future ของ ref
+    jobs = st.session_state.setdefault('ingest_jobs', {})
+    if uploaded.file_id not in jobs:
+        jobs[uploaded.file_id] = get_ingest_pool().submit(uploaded.getvalue())
+        for old in list(jobs)[:-INGEST_KEEP]:
+            if jobs[old].done():
+                del jobs[old]
+    return jobs[uploaded.file_id]
+
+def upload_previews(uploaded_files):
+    # preview ทำครั้งเดียวต่อไฟล์ -> rerun อื่นๆ (search / sell) ระหว่างที่ไฟล์ยังค้างใน uploader ไม่ต้อง decode ซ้ำ
+    from images import preview_image
+    cache = st.session_state.get('upload_previews', {})
+    previews = {f.file_id: cache.get(f.file_id) or preview_image(f.getvalue()) for f in uploaded_files}
+    st.session_state.upload_previews = previews  # เก็บเฉพาะไฟล์ที่ยังอยู่ใน uploader
+    return list(previews.values())
+
+def show_image(row, variant='grid'):
+    ref = getattr(row, 'image_path', None)
+    image_store = get_image_store()
+    path = image_store.path(ref, variant, 'webp') or image_store.path(ref, variant)
+    if path:
+        st.image(path, use_container_width=True)
+    elif pd.notna(row.image_base64) and str(row.image_base64).startswith('data:image'):
+        st.image(row.image_base64, use_container_width=True)  # รูปเก่าที่ยังไม่ได้ migrate / ไฟล์หายไปตอน restart
+    else:
+        st.markdown("*(No Image)*")
+
+# --- Pagination & การ์ดที่กำลังใช้งาน ---
+PAGE_SIZE = int(st.secrets.get("ui", {}).get("page_size", 12))
+
+def _turn_page(key, step):
+    st.session_state[f"page_{key}"]['page'] += step
+
+def paginate(df, key, reset_on=None, page_size=PAGE_SIZE):
+    # แสดงทีละหน้า -> เวลา rerun ขึ้นกับ page_size ไม่ใช่จำนวนสินค้าทั้งหมด
+    pages = max(1, -(-len(df) // page_size))
+    state = st.session_state.setdefault(f"page_{key}", {'page': 0, 'sig': reset_on})
+    if state['sig'] != reset_on:  # เปลี่ยน search/filter -> กลับไปหน้าแรก
+        state.update(page=0, sig=reset_on)
+    state['page'] = min(max(state['page'], 0), pages - 1)
+    page = state['page']
+    if pages > 1:
+        c_prev, c_info, c_next = st.columns([1, 2, 1])
+        c_prev.button("◀ Prev", key=f"prev_{key}", disabled=page == 0, use_container_width=True,
+                      on_click=_turn_page, args=(key, -1))
+        c_info.caption(f"<div style='text-align:center'>Page {page + 1} / {pages} · {len(df)} items</div>", unsafe_allow_html=True)
+        c_next.button("Next ▶", key=f"next_{key}", disabled=page >= pages - 1, use_container_width=True,
+                      on_click=_turn_page, args=(key, 1))
+    return df.iloc[page * page_size:(page + 1) * page_size]
+
+def _toggle_action(state_key, action, pid, version=None):
+    # จำ row_version ตอนเปิดการ์ดไว้ -> กดยืนยันแล้วจะเขียนได้เฉพาะถ้ายังไม่มีเครื่องอื่นแก้ชิ้นนี้ในระหว่างนั้น
+    current = st.session_state.get(state_key)
+    same = current is not None and current[:2] == (action, str(pid))
+    st.session_state[state_key] = None if same else (action, str(pid), int(version or 0))
+
+def active_action(state_key, pid):
+    # ฟอร์มหนักๆ (Sell / Edit / อัปรูป) สร้างเฉพาะการ์ดที่กดอยู่เท่านั้น
+    current = st.session_state.get(state_key)
+    return current[0] if current and current[1] == str(pid) else None
+
+def _accept_latest(state_key, version):
+    action, pid, _ = st.session_state[state_key]
+    st.session_state[state_key] = (action, pid, int(version))
+
+def seen_version(state_key, row):
+    # version ที่ user เห็นตอนเปิดการ์ด ถ้าเครื่องอื่นแก้ไปแล้วให้ดูข้อมูลใหม่แล้วกดรับก่อนถึงจะยืนยันได้
+    seen = st.session_state[state_key][2]
+    if seen != row.row_version:
+        st.warning("⚠️ ชิ้นนี้ถูกแก้จากอีกเครื่องหลังจากเปิดไว้ ข้อมูลด้านบนเป็นของล่าสุดแล้ว")
+        st.button("🔄 Use latest", key=f"latest_{row.product_id}", on_click=_accept_latest, args=(state_key, row.row_version))
+    return seen
+
+def _confirm_restock(pid, version, name):
+    # args ของ on_click ผูกตอน render -> ได้ row_version ที่ user เห็นจริงๆ ไม่ใช่ของที่โหลดใหม่ในรอบที่กด
+    st.session_state.sold_action = (str(pid), int(version or 0), name)
+
+def stale_write(name):
+    # compare-and-set ไม่ผ่าน: ไม่ได้เขียนอะไร -> rerun โหลดของล่าสุดแล้วบอก user ให้ตรวจแล้วลองใหม่
+    st.session_state.stale_notice = f"⚠️ **{name}** ถูกแก้/ขายจากอีกเครื่องไปก่อนแล้ว ไม่ได้บันทึก — ตรวจข้อมูลล่าสุดแล้วลองอีกครั้ง"
 
 # --- Sidebar (ใส่ Logo ตรงนี้) ---
 with st.sidebar:
@@ -101,53 +286,97 @@ with st.sidebar:
 
     selected = option_menu(
         menu_title=None,
-        options=["Dashboard", "Transactions", "Inventory", "Sold Items"],
-        icons=["grid-1x2", "wallet", "box-seam-fill", "bag-check-fill"], 
+        options=["Dashboard", "Transactions", "Inventory", "Sold Items", "Reports", "Import / Export"],
+        icons=["grid-1x2", "wallet", "box-seam-fill", "bag-check-fill", "graph-up-arrow", "arrow-down-up"], 
         default_index=0,
     )
+    profiling.set_label(selected)
+    # รันบน SQLite แล้วใช้ Google Sheets เป็นที่ export
+    if backend.name == "sqlite":
+        if st.button("⬆️ Export to Google Sheets", use_container_width=True):
+            backend.export_to(get_sheets_backend())
+            st.toast("Exported!")
+    # จำนวนรายการที่ยังรอ sync ขึ้น Google Sheets
+    from sync import WriteBehindBackend
+    if isinstance(backend, WriteBehindBackend):
+        pending = backend.pending_count()
+        if pending:
+            st.caption(f"🔄 Pending sync: **{pending}**")
+            if backend.last_error():
+                st.caption(f"⚠️ {backend.last_error()}")
+        else:
+            st.caption("✅ Synced")
+    # rerun ล่าสุด N ครั้ง (ไม่รวมรอบนี้ที่ยังไม่จบ)
+    if profile_history is not None:
+        with st.expander("⏱️ Profiler"):
+            done = [r for r in profile_history if r.total_ms is not None][::-1]
+            if not done:
+                st.caption("ยังไม่มีข้อมูล ลองเปลี่ยนหน้าหรือกดปุ่มดูก่อน")
+            else:
+                st.dataframe(pd.DataFrame([{'page': r.label, 'ms': round(r.total_ms, 1), 'spans': len(r.spans)}
+                                           for r in done]), use_container_width=True, hide_index=True)
+                pick = st.selectbox("Rerun", range(len(done)), key="profile_pick",
+                                    format_func=lambda i: f"{done[i].label} · {done[i].total_ms:,.0f} ms")
+                spans = pd.DataFrame(done[pick].spans)
+                if not spans.empty:
+                    spans['name'] = ["  " * d + n for d, n in zip(spans.pop('depth'), spans['name'])]
+                    st.dataframe(spans.round(2), use_container_width=True, hide_index=True)
+                c_json, c_trace = st.columns(2)
+                c_json.download_button("JSON", profiling.to_json(done), file_name="profile.json",
+                                       mime="application/json", use_container_width=True)
+                c_trace.download_button("Trace", profiling.to_chrome_trace(done), file_name="profile.trace.json",
+                                        mime="application/json", use_container_width=True,
+                                        help="เปิดใน chrome://tracing หรือ ui.perfetto.dev")
     st.divider()
     st.caption("Designed for Fiw")
 
 # --- Load Data ---
-df_trans = get_data("transactions")
-df_prod = get_data("products")
+# ทุกหน้าใช้แค่ id (เช็คว่าร้านว่างไหม) ที่เหลือแต่ละหน้าโหลดเอง -> Dashboard / Transactions ไม่แตะคอลัมน์รูป
+with span("data.load"):
+    df_prod = get_data("products", ['product_id'])
+
+def has_base64_images():
+    # สแกนคอลัมน์รูปครั้งเดียวต่อ version ของ products (ไม่ใช่ทุก rerun)
+    version = backend.version("products")
+    checked = st.session_state.get('base64_check')
+    if version is None or checked is None or checked[0] != version:
+        images = get_data("products", PAGE_COLUMNS['images'])
+        checked = (version, bool(images['image_base64'].astype(str).str.startswith('data:image').any()))
+        st.session_state.base64_check = checked
+    return checked[1]
+
+# ย้ายรูป base64 เก่าออกจาก sheet ไปไว้ใน image store (กดครั้งเดียวพอ) -- เช็คเฉพาะหน้า Inventory
+if selected == "Inventory" and has_base64_images():
+    with st.sidebar.popover("🧹 Migrate images", use_container_width=True):
+        st.caption("ย้ายรูป base64 ออกจาก Google Sheet ไปเก็บเป็นไฟล์ เพื่อให้ sheet เล็กลง")
+        if not IMAGE_PATH:
+            # migrate แล้ว base64 ใน sheet ถูกล้าง -> ถ้าไฟล์อยู่บน disk ชั่วคราว รูปจะหายตอน restart
+            st.warning("ตั้ง `[images] path` ใน secrets ให้ชี้ไปที่ disk ถาวรก่อน ถึงจะ migrate ได้")
+        elif st.button("Start", key="migrate_images", type="primary"):
+            from images import migrate_base64
+            changes = migrate_base64(get_data("products", PAGE_COLUMNS['images']), get_image_store())
+            with edit_rows("products") as b:
+                for pid, values in changes.items():
+                    b.update(pid, values)
+            st.toast(f"Migrated {len(changes)} images!")
+            st.rerun()
 
-if df_trans.empty:
-    df_trans = pd.DataFrame(columns=['date', 'type', 'title', 'amount'])
-if df_prod.empty:
-    df_prod = pd.DataFrame(columns=['product_id', 'name', 'category', 'image_base64', 'sell_price', 'discount_price', 'cost_price', 'status', 'actual_sold_price', 'sold_date'])
+if st.session_state.get('stale_notice'):
+    st.warning(st.session_state.pop('stale_notice'))
 
 # === PAGE: DASHBOARD (Updated) ===
 if selected == "Dashboard":
     st.markdown("### 👋 HighClass Dashboard")
     
-    # 1. คำนวณตัวเลข
-    if not df_trans.empty:
-        inc = df_trans[df_trans['type']=='รายรับ']['amount'].sum()
-        exp = df_trans[df_trans['type']=='รายจ่าย']['amount'].sum()
-    else: inc, exp = 0, 0
-
-    if not df_prod.empty:
-        # ของที่ขายแล้ว
-        sold_items = df_prod[df_prod['status']=='Sold']
-        total_revenue = sold_items['actual_sold_price'].sum() # ยอดขายจริง
-        realized_profit = total_revenue - sold_items['cost_price'].sum() # กำไรจริง
-        sold_count = len(sold_items)
-
-        # ของที่ยังอยู่ (Available)
-        available_items = df_prod[df_prod['status']=='Available']
-        stock_val = available_items['cost_price'].sum() # ทุนจม (Asset)
-        
-        # --- คำนวณตัวเลขใหม่ที่ฟิวขอ ---
-        potential_revenue = available_items['sell_price'].sum() # ถ้าขายหมดจะได้เงินเท่าไหร่
-        potential_profit = potential_revenue - stock_val        # ถ้าขายหมดจะได้กำไรเท่าไหร่
-        total_investment = df_prod['cost_price'].sum()          # ต้นทุนเสื้อทั้งหมดตั้งแต่วันแรก
-
-    else: 
-        total_revenue, stock_val, realized_profit, sold_count = 0, 0, 0, 0
-        potential_revenue, potential_profit, total_investment = 0, 0, 0
-
-    net_cash = (inc + total_revenue) - (exp + total_investment) # แก้สูตร Net Cash ให้หักทุนทั้งหมด
+    # 1. ตัวเลข (อัปเดตทีละแถวตอนขาย/เพิ่ม/แก้ คำนวณใหม่ทั้งหมดเฉพาะตอน version เปลี่ยน)
+    with span("dashboard.kpi"):
+        kpi = get_kpis().sync(backend)
+    realized_profit, sold_count = kpi.realized_profit, kpi.sold_count # กำไรจริง
+    stock_val = kpi.stock_cost                                         # ทุนจม (Asset)
+    potential_revenue = kpi.stock_sell                                 # ถ้าขายหมดจะได้เงินเท่าไหร่
+    potential_profit = kpi.potential_profit                            # ถ้าขายหมดจะได้กำไรเท่าไหร่
+    total_investment = kpi.total_investment                            # ต้นทุนเสื้อทั้งหมดตั้งแต่วันแรก
+    net_cash = kpi.net_cash # (รายรับ + ยอดขาย) - (รายจ่าย + ทุนทั้งหมด)
 
     # 2. แสดงผล (แถวที่ 1: สถานะปัจจุบัน)
     st.markdown("##### ⚡ สถานะปัจจุบัน (Current Status)")
@@ -172,36 +401,22 @@ if selected == "Dashboard":
     
     with c_chart1:
         st.subheader("📊 Stock by Category")
-        if not df_prod.empty:
-            stock_data = df_prod[df_prod['status']=='Available']['category'].value_counts()
-            if not stock_data.empty:
-                st.bar_chart(stock_data, color="#FF4B4B")
-            else:
-                st.info("No stock data.")
-    
-    with c_chart2:
-        st.subheader("📈 Sales Trend")
-        if not df_prod.empty:
-            sales_data = df_prod[df_prod['status']=='Sold'].copy()
-            if not sales_data.empty and 'sold_date' in sales_data.columns:
-                sales_data['sold_date'] = pd.to_datetime(sales_data['sold_date'])
-                daily_sales = sales_data.groupby(sales_data['sold_date'].dt.date)['actual_sold_price'].sum()
-                st.line_chart(daily_sales, color="#00CC96")
-            else:
-                st.info("No sales yet.")
-
+        with span("dashboard.stock_series"):
+            stock_data = kpi.stock_series()
+        if not stock_data.empty:
+            st.bar_chart(stock_data, color="#FF4B4B")
+        else:
+            st.info("No stock data.")
     
     with c_chart2:
         st.subheader("📈 Sales Trend")
-        if not df_prod.empty:
-            sales_data = df_prod[df_prod['status']=='Sold'].copy()
-            if not sales_data.empty and 'sold_date' in sales_data.columns:
-                # แปลงวันที่ให้เป็น Format ที่กราฟอ่านรู้เรื่อง
-                sales_data['sold_date'] = pd.to_datetime(sales_data['sold_date'])
-                daily_sales = sales_data.groupby(sales_data['sold_date'].dt.date)['actual_sold_price'].sum()
-                st.line_chart(daily_sales, color="#00CC96")
-            else:
-                st.info("No sales yet.")
+        start, end = date_range("trend_range", months=3)
+        with span("dashboard.daily_sales"):
+            daily_sales = kpi.daily_sales(start, end)  # ตัด series รายวันของ KPI ตามช่วง ไม่ต้อง query ยอดขาย
+        if not daily_sales.empty:
+            st.line_chart(daily_sales, color="#00CC96")
+        else:
+            st.info("No sales yet.")
 
 # === PAGE: TRANSACTIONS ===
 elif selected == "Transactions":
@@ -213,14 +428,25 @@ elif selected == "Transactions":
         d_title = c3.text_input("Title")
         d_amt = c4.number_input("Amount", min_value=0.0)
         if st.form_submit_button("Add Entry", type="primary"):
-            new_row = pd.DataFrame([{'date': str(d_date), 'type': d_type, 'title': d_title, 'amount': d_amt}])
-            updated_df = pd.concat([df_trans, new_row], ignore_index=True)
-            save_data(updated_df, "transactions")
+            with edit_rows("transactions", key='date') as b:
+                b.append({'date': str(d_date), 'type': d_type, 'title': d_title, 'amount': d_amt})
             st.toast("Saved!")
             st.rerun()
 
+    # อ่านเฉพาะเดือนในช่วงที่เลือก (เดือนที่ปิดแล้วมาจาก snapshot)
+    history = get_history().sync(backend)
+    start, end = date_range("trans_range")
+    df_trans = history.range(backend, 'transactions', start, end)
     if not df_trans.empty:
-        st.dataframe(df_trans.sort_index(ascending=False), use_container_width=True, hide_index=True)
+        income = df_trans.loc[df_trans['type'] == "รายรับ", 'amount'].sum()
+        expense = df_trans.loc[df_trans['type'] == "รายจ่าย", 'amount'].sum()
+        st.caption(f"รายรับ **฿ {income:,.0f}** · รายจ่าย **฿ {expense:,.0f}** · {len(df_trans)} รายการ")
+        st.dataframe(df_trans.iloc[::-1], use_container_width=True, hide_index=True,
+                     column_config={'date': st.column_config.DateColumn("date")})
+    else:
+        st.caption("ไม่มีรายการในช่วงนี้")
+    with st.expander("📆 Monthly totals"):
+        st.dataframe(history.monthly(backend, 'transactions', start, end), use_container_width=True)
 
 # === PAGE: INVENTORY ===
 elif selected == "Inventory":
@@ -230,34 +456,33 @@ elif selected == "Inventory":
     
     # --- TAB: SHOP ---
     with tab_sell:
-        if 'category' not in df_prod.columns: df_prod['category'] = 'Uncategorized'
-        all_cats = ["All"] + sorted(df_prod[df_prod['status']=='Available']['category'].astype(str).unique().tolist())
+        with span("shop.index"):
+            index = get_search_index().sync(backend)
+        all_cats = ["All"] + index.categories()
         
         c_search, c_filter = st.columns([2, 1])
-        q = c_search.text_input("Search", placeholder="🔍 ID or Name...", label_visibility="collapsed")
+        q = c_search.text_input("Search", placeholder="🔍 ID, Name or Brand...", label_visibility="collapsed")
         cat_filter = c_filter.selectbox("📂 Filter by Category", all_cats, label_visibility="collapsed")
 
         if not df_prod.empty:
-            items = df_prod[df_prod['status'] == 'Available']
-            if cat_filter != "All": items = items[items['category'] == cat_filter]
-            if q:
-                mask = items['product_id'].astype(str).str.contains(q, case=False) | items['name'].str.contains(q, case=False)
-                items = items[mask]
+            with span("shop.query", q=q, category=cat_filter) as sp:
+                items = backend.available_items(None if cat_filter == "All" else cat_filter)
+                if q:
+                    items = items[items['product_id'].isin(index.search(q))]
+                sp.set(rows=len(items))
 
             if items.empty: 
                 st.info(f"ไม่พบสินค้า")
             
-            # Loop แสดงสินค้า
-            for i in range(0, len(items), 2):
+            # Loop แสดงสินค้า (ทีละหน้า)
+            page_items = paginate(items, "shop", reset_on=(q, cat_filter))
+            for i in range(0, len(page_items), 2):
                 cols = st.columns(2)
-                for idx, row in enumerate(items.iloc[i:i+2].itertuples()):
-                    with cols[idx]:
+                for idx, row in enumerate(page_items.iloc[i:i+2].itertuples()):
+                    with cols[idx], span("render.shop_card", product_id=row.product_id):
                         with st.container(border=True):
                             # รูปภาพ
-                            if pd.notna(row.image_base64) and str(row.image_base64).startswith('data:image'):
-                                st.image(row.image_base64, use_container_width=True)
-                            else:
-                                st.markdown("*(No Image)*")
+                            show_image(row)
                             
                             st.markdown(f"**{row.name}**")
                             st.caption(f"📂 {row.category} | ID: {row.product_id}")
@@ -272,19 +497,8 @@ elif selected == "Inventory":
                             b_sell, b_cap, b_edit = st.columns([2, 1, 1])
                             
                             # --- 1. ปุ่มขาย (SELL) ---
-                            with b_sell:
-                                with st.popover("⚡ Sell", use_container_width=True):
-                                    st.markdown(f"Selling: **{row.name}**")
-                                    actual_p = st.number_input("Price", value=float(row.sell_price), key=f"p_{unique_key_suffix}")
-                                    
-                                    if actual_p < row.cost_price: st.warning("⚠️ ขาดทุน!")
-                                    elif actual_p < row.discount_price: st.warning("⚠️ ต่ำกว่า Floor!")
-
-                                    if st.button("Confirm", key=f"b_sell_{unique_key_suffix}", type="primary"):
-                                        df_prod.loc[row.Index, ['status','actual_sold_price','sold_date']] = ['Sold', actual_p, str(datetime.now())]
-                                        save_data(df_prod, "products")
-                                        st.toast(f"Sold {row.name}!")
-                                        st.rerun()
+                            b_sell.button("⚡ Sell", key=f"open_sell_{unique_key_suffix}", use_container_width=True,
+                                          on_click=_toggle_action, args=("shop_action", "sell", row.product_id, row.row_version))
 
                             # --- 2. ปุ่มแคปชั่น (COPY) ---
                             with b_cap:
@@ -308,42 +522,72 @@ __________________________
                                     st.code(caption_txt, language="markdown")
 
                             # --- 3. ปุ่มแก้ไข (EDIT) ---
-                            with b_edit:
-                                with st.popover("✏️", use_container_width=True):
-                                    st.markdown(f"**Edit: {row.name}**")
-                                    with st.form(key=f"edit_form_{unique_key_suffix}"):
-                                        e_name = st.text_input("Name", value=row.name)
-                                        e_cat = st.text_input("Category", value=row.category)
-                                        ec1, ec2, ec3 = st.columns(3)
-                                        e_cost = ec1.number_input("Cost", value=float(row.cost_price))
-                                        e_sell = ec2.number_input("Sell", value=float(row.sell_price))
-                                        e_floor = ec3.number_input("Floor", value=float(row.discount_price))
-                                        e_img = st.file_uploader("Change Image", type=['png','jpg','jpeg'])
+                            b_edit.button("✏️", key=f"open_edit_{unique_key_suffix}", use_container_width=True,
+                                          on_click=_toggle_action, args=("shop_action", "edit", row.product_id, row.row_version))
+
+                            action = active_action("shop_action", row.product_id)
+                            seen = seen_version("shop_action", row) if action else None
+                            if action == "sell":
+                                st.markdown(f"Selling: **{row.name}**")
+                                actual_p = st.number_input("Price", value=row.sell_price, key=f"p_{unique_key_suffix}")
+                                
+                                if actual_p < row.cost_price: st.warning("⚠️ ขาดทุน!")
+                                elif actual_p < row.discount_price: st.warning("⚠️ ต่ำกว่า Floor!")
+
+                                if st.button("Confirm", key=f"b_sell_{unique_key_suffix}", type="primary"):
+                                    try:
+                                        with edit_rows("products") as b:
+                                            b.update(row.product_id, {'status': 'Sold', 'actual_sold_price': actual_p, 'sold_date': str(datetime.now())},
+                                                     expect=seen)
+                                    except StaleWriteError:
+                                        stale_write(row.name)
+                                    else:
+                                        st.session_state.shop_action = None
+                                        st.toast(f"Sold {row.name}!")
+                                    st.rerun()
+
+                            elif action == "edit":
+                                st.markdown(f"**Edit: {row.name}**")
+                                # uploader อยู่นอก form -> ไฟล์มาถึงเมื่อไรก็เริ่มแปลงใน pool เลย ไม่ต้องรอกด Save
+                                e_img = st.file_uploader("Change Image", type=['png','jpg','jpeg'], key=f"edit_img_{unique_key_suffix}")
+                                e_job = ingest_upload(e_img) if e_img else None
+                                if e_job is not None and not e_job.done():
+                                    st.caption("⏳ กำลังแปลงรูป...")
+                                with st.form(key=f"edit_form_{unique_key_suffix}"):
+                                    e_name = st.text_input("Name", value=row.name)
+                                    e_cat = st.text_input("Category", value=row.category)
+                                    ec1, ec2, ec3 = st.columns(3)
+                                    e_cost = ec1.number_input("Cost", value=row.cost_price)
+                                    e_sell = ec2.number_input("Sell", value=row.sell_price)
+                                    e_floor = ec3.number_input("Floor", value=row.discount_price)
+                                    
+                                    if st.form_submit_button("Save"):
+                                        changes = {'name': e_name, 'category': e_cat, 'cost_price': e_cost,
+                                                   'sell_price': e_sell, 'discount_price': e_floor}
+                                        if e_job is not None:
+                                            changes.update(e_job.result())  # ปกติแปลงเสร็จไปแล้วระหว่างกรอกฟอร์ม
                                         
-                                        if st.form_submit_button("Save"):
-                                            df_prod.at[row.Index, 'name'] = e_name
-                                            df_prod.at[row.Index, 'category'] = e_cat
-                                            df_prod.at[row.Index, 'cost_price'] = e_cost
-                                            df_prod.at[row.Index, 'sell_price'] = e_sell
-                                            df_prod.at[row.Index, 'discount_price'] = e_floor
-                                            if e_img:
-                                                new_image = Image.open(e_img)
-                                                new_image = ImageOps.exif_transpose(new_image)
-                                                df_prod.at[row.Index, 'image_base64'] = image_to_base64(new_image)
-                                            
-                                            save_data(df_prod, "products")
+                                        try:
+                                            with edit_rows("products") as b:
+                                                b.update(row.product_id, changes, expect=seen)
+                                        except StaleWriteError:
+                                            stale_write(row.name)
+                                        else:
+                                            st.session_state.shop_action = None
                                             st.success("Updated!")
-                                            st.rerun()
+                                        st.rerun()
         else:
             st.info("Stock is empty.")
     
     # --- TAB: ADD ITEM ---
     with tab_add:
-        uploaded_file = st.file_uploader("Upload Image", type=['png','jpg','jpeg'])
-        if uploaded_file:
-            image = Image.open(uploaded_file)
-            image = ImageOps.exif_transpose(image)
-            st.image(image, caption="Preview", width=200)
+        uploaded_files = st.file_uploader("Upload Image", type=['png','jpg','jpeg'], accept_multiple_files=True)
+        previews = upload_previews(uploaded_files or [])
+        if uploaded_files:
+            jobs = [ingest_upload(f) for f in uploaded_files]  # แปลงรูปขนานกันใน background
+            st.image(previews, caption=["Preview"] * len(uploaded_files), width=200)
+            if len(uploaded_files) > 1:
+                st.caption(f"📸 {len(uploaded_files)} รูป -> จะสร้าง {len(uploaded_files)} ชิ้น ID ต่อท้าย -1, -2, ... (ชื่อ/ราคาเดียวกัน)")
 
         with st.form("add_prod", clear_on_submit=True):
             c1, c2 = st.columns(2)
@@ -357,27 +601,38 @@ __________________________
             nfloor = c6.number_input("Floor Price (ต่ำสุด)", min_value=0.0)
             
             if st.form_submit_button("Save Item", type="primary"):
-                if nid and nname and uploaded_file:
-                    img_str = image_to_base64(image)
+                if nid and nname and uploaded_files:
                     final_cat = ncat if ncat else "General" 
-                    new_item = pd.DataFrame([{
-                        'product_id': nid, 'name': nname, 'category': final_cat, 'image_base64': img_str,
-                        'sell_price': nprice, 'discount_price': nfloor, 'cost_price': ncost,
-                        'status': 'Available', 'actual_sold_price': 0, 'sold_date': None
-                    }])
-                    updated_stock = pd.concat([df_prod, new_item], ignore_index=True)
-                    save_data(updated_stock, "products")
-                    st.success(f"Added {nname}!")
-                    st.rerun()
+                    ids = [nid] if len(jobs) == 1 else [f"{nid}-{i}" for i in range(1, len(jobs) + 1)]
+                    taken = sorted(set(ids) & set(df_prod['product_id'].astype(str)))
+                    try:
+                        if taken:
+                            raise DuplicateKeyError("products", taken)
+                        with edit_rows("products") as b:
+                            for pid, job in zip(ids, jobs):
+                                b.append({
+                                    'product_id': pid, 'name': nname, 'category': final_cat,
+                                    **job.result(),  # image_path (+ image_base64 ถ้า store ไม่ถาวร)
+                                    'sell_price': nprice, 'discount_price': nfloor, 'cost_price': ncost,
+                                    'status': 'Available', 'actual_sold_price': 0, 'sold_date': None,
+                                    'listed_date': str(datetime.now()),
+                                })
+                    except DuplicateKeyError as e:
+                        # id ซ้ำ (ของเดิมในร้าน หรือ -1/-2 ที่ชนกับชิ้นที่มีอยู่) -> ไม่ได้เพิ่มอะไรเลย
+                        st.error(f"❌ ID ซ้ำกับสินค้าที่มีอยู่แล้ว: {', '.join(e.ids)} — เปลี่ยน ID แล้วลองใหม่")
+                    else:
+                        st.success(f"Added {nname}!")
+                        st.rerun()
                 else:
                     st.error("Please fill all fields & upload image.")
 
     # --- TAB: HISTORY ---
     with tab_hist:
         if not df_prod.empty:
-            sold_items = df_prod[df_prod['status']=='Sold']
+            start, end = date_range("sales_range")
+            sold_items = get_history().sync(backend).range(backend, 'sales', start, end).iloc[::-1]
             if not sold_items.empty:
-                sold_items['profit'] = sold_items['actual_sold_price'] - sold_items['cost_price']
+                sold_items = sold_items.assign(profit=sold_items['actual_sold_price'] - sold_items['cost_price'])
                 st.dataframe(sold_items[['sold_date','name','category','actual_sold_price','profit']], use_container_width=True, hide_index=True)
             else:
                 st.caption("No sales yet.")
@@ -385,10 +640,20 @@ __________________________
 # === PAGE: SOLD ITEMS ===
 elif selected == "Sold Items":
     st.markdown("### ✅ Sold Out Gallery")
+    restock = st.session_state.pop("sold_action", None)
+    if restock:
+        pid, seen, name = restock
+        try:
+            with edit_rows("products") as b:
+                b.update(pid, {'status': 'Available', 'actual_sold_price': 0, 'sold_date': None}, expect=seen)
+        except StaleWriteError:
+            stale_write(name)
+        else:
+            st.toast(f"Restored {name}!")
+        st.rerun()
+
     if not df_prod.empty:
-        sold_items = df_prod[df_prod['status'] == 'Sold']
-        if 'sold_date' in sold_items.columns:
-            sold_items = sold_items.sort_values(by='sold_date', ascending=False)
+        sold_items = backend.sold_items()
 
         if sold_items.empty:
             st.info("ยังไม่มีสินค้าที่ขายออกไป สู้ๆ ครับ! ✌️")
@@ -398,19 +663,16 @@ elif selected == "Sold Items":
             st.metric("🎉 Total Sales Volume", f"฿ {total_rev:,.0f}", f"Profit: ฿ {total_profit:,.0f}")
             st.divider()
 
-            for i in range(0, len(sold_items), 2):
+            page_items = paginate(sold_items, "sold")
+            for i in range(0, len(page_items), 2):
                 cols = st.columns(2)
-                for idx, row in enumerate(sold_items.iloc[i:i+2].itertuples()):
-                    with cols[idx]:
+                for idx, row in enumerate(page_items.iloc[i:i+2].itertuples()):
+                    with cols[idx], span("render.sold_card", product_id=row.product_id):
                         with st.container(border=True):
-                            if pd.notna(row.image_base64) and str(row.image_base64).startswith('data:image'):
-                                st.image(row.image_base64, use_container_width=True)
-                            else:
-                                st.markdown("*(No Image)*")
+                            show_image(row)
                             
                             st.markdown(f"**{row.name}**")
-                            cat_show = row.category if 'category' in df_prod.columns else '-'
-                            st.caption(f"ID: {row.product_id} | 📂 {cat_show}")
+                            st.caption(f"ID: {row.product_id} | 📂 {row.category}")
                             
                             c1, c2 = st.columns(2)
                             c1.markdown(f"💰 Sold: **{row.actual_sold_price:,.0f}**")
@@ -423,12 +685,93 @@ elif selected == "Sold Items":
                             unique_key_sold = f"restore_{row.product_id}_{row.Index}"
                             with st.popover("❌ Cancel / Restock", use_container_width=True):
                                 st.markdown(f"ดึง **{row.name}** กลับไปขายใหม่?")
-                                if st.button("ยืนยัน", key=unique_key_sold, type="primary"):
-                                    df_prod.at[row.Index, 'status'] = 'Available'
-                                    df_prod.at[row.Index, 'actual_sold_price'] = 0
-                                    df_prod.at[row.Index, 'sold_date'] = None
-                                    save_data(df_prod, "products")
-                                    st.toast(f"Restored {row.name}!")
-                                    st.rerun()
+                                st.button("ยืนยัน", key=unique_key_sold, type="primary",
+                                          on_click=_confirm_restock, args=(row.product_id, row.row_version, row.name))
     else:
         st.info("No data available.")
+
+# === PAGE: REPORTS ===
+elif selected == "Reports":
+    st.markdown("### 📈 Reports")
+    reports = get_reports()
+    report = st.radio("Report", ["Monthly P&L", "Margin by Category", "Sell-through", "Stock Aging", "Price vs Floor"],
+                      horizontal=True, label_visibility="collapsed")
+
+    if report == "Monthly P&L":
+        start, end = date_range("pnl_range", months=12)
+        pnl = reports.monthly_pnl(backend, start, end)
+        if pnl.empty:
+            st.info("ไม่มีข้อมูลในช่วงนี้")
+        else:
+            c1, c2, c3 = st.columns(3)
+            c1.metric("💰 Revenue", f"฿ {pnl['revenue'].sum():,.0f}", f"{pnl['sold'].sum()} Sold")
+            c2.metric("✨ Gross Profit", f"฿ {pnl['gross_profit'].sum():,.0f}")
+            c3.metric("🧾 Net", f"฿ {pnl['net'].sum():,.0f}", help="กำไรขั้นต้น + รายรับอื่น - รายจ่าย")
+            st.bar_chart(pnl[['gross_profit', 'net']])
+            st.dataframe(pnl, use_container_width=True)
+
+    elif report == "Margin by Category":
+        start, end = date_range("margin_range", months=12)
+        margins = reports.category_margins(backend, start, end)
+        if margins.empty:
+            st.info("ไม่มีของที่ขายในช่วงนี้")
+        else:
+            st.bar_chart(margins['profit'], color="#00CC96")
+            st.dataframe(margins, use_container_width=True)
+
+    elif report == "Sell-through":
+        st.caption("สัดส่วนของที่ขายออกแล้วจากทั้งหมดที่เคยลงขาย แยกตาม category")
+        st.dataframe(reports.sell_through(backend), use_container_width=True,
+                     column_config={'sell_through_pct': st.column_config.ProgressColumn("sell-through %", min_value=0, max_value=100, format="%.1f%%")})
+
+    elif report == "Stock Aging":
+        table, oldest, unknown = reports.stock_aging(backend)
+        st.bar_chart(table['items'], color="#FF4B4B")
+        st.dataframe(table, use_container_width=True)
+        if unknown:
+            st.caption(f"ℹ️ {unknown} ชิ้นไม่มีวันที่ลงขาย (เพิ่มก่อนเริ่มเก็บ listed_date) ไม่ได้นับในตาราง")
+        st.markdown("##### 🐢 ค้างนานที่สุด")
+        st.dataframe(oldest, use_container_width=True, hide_index=True)
+
+    elif report == "Price vs Floor":
+        start, end = date_range("price_range", months=12)
+        realization = reports.price_realization(backend, start, end)
+        if realization.empty:
+            st.info("ไม่มีของที่ขายในช่วงนี้")
+        else:
+            st.caption("avg_pct_of_list = ขายได้กี่ % ของราคาตั้ง · below_floor = จำนวนที่ขายต่ำกว่า Floor")
+            st.dataframe(realization, use_container_width=True)
+
+# === PAGE: IMPORT / EXPORT ===
+elif selected == "Import / Export":
+    st.markdown("### 📦 Bulk Import / Export")
+
+    st.markdown("##### 📥 Import")
+    st.caption("CSV คอลัมน์: product_id, name, category, cost_price, sell_price, discount_price  |  "
+               "ZIP รูป: ตั้งชื่อไฟล์ตาม product_id เช่น TEST01.jpg")
+    with st.form("bulk_import"):
+        csv_file = st.file_uploader("Products CSV", type=['csv'])
+        zip_file = st.file_uploader("Images ZIP (optional)", type=['zip'])
+        if st.form_submit_button("Import", type="primary"):
+            if csv_file is None:
+                st.error("Please upload a CSV file.")
+            else:
+                progress = st.empty()
+                from bulk import import_catalog
+                result = import_catalog(backend, get_ingest_pool(), csv_file, zip_file,
+                                        on_progress=lambda r: progress.caption(f"⏳ {r['added'] + r['updated']} rows..."))
+                progress.empty()
+                st.success(f"Added {result['added']} · Updated {result['updated']} · Images {result['images']}")
+                for err in result['errors'][:20]:
+                    st.warning(err)
+
+    st.divider()
+    st.markdown("##### 📤 Export")
+    if st.button("Prepare export (products + transactions + images)"):
+        from bulk import export_catalog
+        # ส่งให้ปุ่ม download ในรอบนี้เลย ไม่เก็บ ZIP ไว้ใน session_state (รอบถัดไปปุ่มหาย ข้อมูลก็ถูกปล่อย)
+        with export_catalog(backend, get_image_store()) as f:
+            st.download_button("⬇️ Download ZIP", f.read(),
+                               file_name=f"highclass_{datetime.now():%Y%m%d}.zip", mime="application/zip")
+
+profiling.end()
@@ -0,0 +1,662 @@
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import pandas as pd
+
+from profiling import span
+from schema import COLUMNS, ENTRY_ID, SCHEMA, UNIQUE_KEYS, coerce, dump, project
+
+# ชื่อ worksheet เล็กๆ ที่เก็บเลข version ของแต่ละ sheet (worksheet, version)
+META_WORKSHEET = "_meta"
+# คอลัมน์เลข version ต่อแถว (ใช้ทำ compare-and-set ตอนหลายเครื่องขายพร้อมกัน)
+ROW_VERSION = 'row_version'
+
+
+class StaleWriteError(Exception):
+    """แถวที่จะแก้ถูกเครื่องอื่นแก้ไปก่อนแล้ว (row_version ไม่ตรงกับที่คาดไว้) -> ไม่ได้เขียนอะไรเลย
+
+    current = {row_id: row_version ล่าสุด (None = แถวถูกลบไปแล้ว)} ให้หน้าเว็บโหลดข้อมูลใหม่แล้วให้ user ยืนยันอีกครั้ง
+    """
+
+    def __init__(self, worksheet, current):
+        super().__init__(f"{worksheet}: {', '.join(current)} ถูกแก้จากที่อื่นแล้ว")
+        self.worksheet = worksheet
+        self.current = current
+
+
+class DuplicateKeyError(Exception):
+    """เพิ่มแถวด้วย id ที่มีอยู่แล้ว (เช่น product_id ซ้ำ) -> ไม่ได้เขียนอะไรเลยทั้ง batch
+
+    ids = [id ที่ซ้ำ] ให้หน้าเว็บบอก user ให้เปลี่ยน id แล้วลองใหม่
+    """
+
+    def __init__(self, worksheet, ids):
+        super().__init__(f"{worksheet}: {', '.join(ids)} มีอยู่แล้ว")
+        self.worksheet = worksheet
+        self.ids = ids
+
+
+# --- 🔌 Backend interface (Google Sheets / SQLite) ---
+class Backend:
+    """สิ่งที่หน้าเว็บต้องใช้จาก storage
+
+    read/write ทั้ง worksheet, batch สำหรับแก้ทีละแถว และ query ของแต่ละหน้า
+    (ตัว default กรองด้วย pandas, backend ที่ query เองได้ค่อย override)
+    """
+
+    name = "base"
+
+    def __init__(self):
+        self._listeners = []
+
+    def read(self, worksheet, columns=None):
+        """DataFrame ที่แปลง dtype ตาม schema แล้ว (columns = อ่านเฉพาะคอลัมน์ที่หน้านั้นใช้)"""
+        raise NotImplementedError
+
+    def version(self, worksheet):
+        """token ที่เปลี่ยนทุกครั้งที่ข้อมูลใน worksheet เปลี่ยน (None = ไม่รู้)"""
+        return None
+
+    def durable_version(self, worksheet):
+        """version ที่ยังมีความหมายหลังเปิดแอปใหม่ (เก็บลงไฟล์ได้) None = ไม่มี ต้องถือว่าเปลี่ยน"""
+        return None
+
+    def write(self, df, worksheet):
+        raise NotImplementedError
+
+    def apply(self, batch):
+        raise NotImplementedError
+
+    def batch(self, worksheet, key='product_id'):
+        return RowBatch(self, worksheet, key)
+
+    # --- listeners (index / KPI ที่อัปเดตตามการเขียนแบบทีละแถว) ---
+    def subscribe(self, listener):
+        """listener(worksheet, batch, old_version, new_version) ถูกเรียกหลังเขียนเสร็จ
+
+        batch เป็น None เมื่อเขียนทับทั้ง worksheet -> ให้ listener สร้างใหม่เอง
+        """
+        if listener not in self._listeners:
+            self._listeners.append(listener)
+
+    def _notify(self, worksheet, batch, old_version, new_version):
+        for listener in list(self._listeners):
+            listener(worksheet, batch, old_version, new_version)
+
+    # --- page queries ---
+    def available_items(self, category=None, columns=None):
+        need = None if columns is None else list(dict.fromkeys([*columns, 'status', 'category']))
+        df = self.read('products', need)  # อ่านเฉพาะคอลัมน์ที่ใช้ (ไม่ลากรูป base64 มาถ้าไม่ได้ขอ)
+        items = df[df['status'] == 'Available']
+        if category is not None:
+            items = items[items['category'] == category]
+        return project(items, columns)
+
+    def sold_items(self, columns=None):
+        need = None if columns is None else list(dict.fromkeys([*columns, 'status', 'sold_date']))
+        df = self.read('products', need)
+        return project(df[df['status'] == 'Sold'].sort_values(by='sold_date', ascending=False), columns)
+
+    def between(self, worksheet, column, start=None, end=None, status=None, columns=None):
+        """แถวที่วันที่ใน column อยู่ในช่วง [start, end) (None = ไม่จำกัด) ใช้กับประวัติรายเดือน"""
+        need = None if columns is None else list(dict.fromkeys([*columns, column] + (['status'] if status else [])))
+        df = self.read(worksheet, need)
+        mask = df[column].notna()
+        if start is not None:
+            mask &= df[column] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= df[column] < pd.Timestamp(end)
+        if status is not None:
+            mask &= df['status'] == status
+        return project(df[mask], columns)
+
+    def export_to(self, target):
+        # ใช้ตอนรันร้านบน SQLite แล้วดันข้อมูลทั้งหมดไปเก็บที่ Google Sheets
+        for worksheet in COLUMNS:
+            target.write(self.read(worksheet), worksheet)
+
+
+# --- 🗃️ Google Sheets + shared cache ของ worksheet (ใช้ร่วมกันทุก session ใน process) ---
+class SheetsBackend(Backend):
+    """เก็บ DataFrame ของแต่ละ worksheet ไว้ 1 entry ต่อ sheet
+
+    ภายใน `ttl` วินาทีจะใช้ของใน cache เลยโดยไม่ยิง API
+    พอเกิน ttl จะเช็ค version จาก `_meta` ก่อน (เบามาก) ถ้าไม่เปลี่ยนก็ใช้ของเดิมต่อ
+    ถ้าเปลี่ยนหรือเช็คไม่ได้ค่อยโหลด sheet ใหม่ทั้งก้อน
+    """
+
+    name = "sheets"
+
+    def __init__(self, conn, spreadsheet, ttl=30):
+        super().__init__()
+        self.conn = conn
+        self.spreadsheet = spreadsheet
+        self.ttl = ttl
+        self._entries = {}  # worksheet -> {'df', 'version', 'checked_at'}
+        self._lock = threading.Lock()
+        self._ws_locks = {}
+
+    def _ws_lock(self, worksheet):
+        with self._lock:
+            return self._ws_locks.setdefault(worksheet, threading.Lock())
+
+    # --- version (_meta worksheet) ---
+    def _read_versions(self):
+        try:
+            with span("sheets.version"):
+                meta = self.conn.read(spreadsheet=self.spreadsheet, worksheet=META_WORKSHEET, ttl=0)
+        except Exception:
+            return None
+        if meta is None or meta.empty or 'worksheet' not in meta.columns:
+            return {}
+        meta = meta.dropna(subset=['worksheet'])
+        return dict(zip(meta['worksheet'].astype(str), meta['version'].astype(str)))
+
+    def remote_version(self, worksheet):
+        versions = self._read_versions()
+        if versions is None:
+            return None
+        return versions.get(worksheet, "0")
+
+    def bump_version(self, worksheet):
+        """ตั้ง version ใหม่ให้ worksheet -> คืน (version ก่อนหน้าบน sheet, version ใหม่)"""
+        versions = self._read_versions()
+        previous = None if versions is None else versions.get(worksheet, "0")
+        versions = versions or {}
+        versions[worksheet] = str(time.time_ns())
+        meta = pd.DataFrame({'worksheet': list(versions), 'version': list(versions.values())})
+        try:
+            with span("sheets.bump_version", worksheet=worksheet):
+                self.conn.update(spreadsheet=self.spreadsheet, worksheet=META_WORKSHEET, data=meta)
+        except Exception:
+            # ยังไม่มี worksheet `_meta` -> สร้างใหม่ (ถ้าสร้างไม่ได้ก็ใช้ ttl อย่างเดียว)
+            try:
+                self._spreadsheet().add_worksheet(title=META_WORKSHEET, rows=20, cols=2)
+                self.conn.update(spreadsheet=self.spreadsheet, worksheet=META_WORKSHEET, data=meta)
+            except Exception:
+                return previous, None
+        return previous, versions[worksheet]
+
+    # --- read / invalidate ---
+    def _download(self, worksheet):
+        with span("sheets.read", worksheet=worksheet) as sp:
+            df = self.conn.read(spreadsheet=self.spreadsheet, worksheet=worksheet, ttl=0)
+            if sp.enabled:
+                sp.set(rows=len(df), bytes=_payload_size(df))
+        return coerce(df, worksheet)
+
+    def _entry(self, worksheet):
+        with self._ws_lock(worksheet):
+            entry = self._entries.get(worksheet)
+            now = time.monotonic()
+            if entry is not None and now - entry['checked_at'] < self.ttl:
+                return entry
+
+            version = self.remote_version(worksheet)
+            if entry is not None and version is not None and version == entry['version']:
+                entry['checked_at'] = now
+                return entry
+
+            df = self._download(worksheet)
+            # ไม่มี `_meta` -> ใช้ token ของเครื่องเราเอง (หมดอายุตาม ttl)
+            entry = {'df': df, 'version': version or f"local:{time.time_ns()}", 'checked_at': time.monotonic()}
+            self._entries[worksheet] = entry
+            return entry
+
+    def read(self, worksheet, columns=None):
+        return project(self._entry(worksheet)['df'], columns).copy()
+
+    def version(self, worksheet):
+        return self._entry(worksheet)['version']
+
+    def durable_version(self, worksheet):
+        version = self.version(worksheet)
+        return None if version.startswith("local:") else version  # local: = token ของ process นี้
+
+    def write(self, df, worksheet):
+        with self._ws_lock(worksheet):
+            with span("sheets.update", worksheet=worksheet) as sp:
+                if sp.enabled:
+                    sp.set(rows=len(df), bytes=_payload_size(df))
+                self.conn.update(spreadsheet=self.spreadsheet, worksheet=worksheet, data=dump(df, worksheet))
+            self._entries.pop(worksheet, None)
+            self.bump_version(worksheet)
+        self._notify(worksheet, None, None, None)
+
+    # --- ✍️ row-level write (ส่งเฉพาะแถว/คอลัมน์ที่เปลี่ยน) ---
+    def _spreadsheet(self):
+        # gspread Spreadsheet ตัวจริงจาก client ของ GSheetsConnection (ต้องใช้ service account)
+        return self.conn.client._open_spreadsheet(spreadsheet=self.spreadsheet)
+
+    def _worksheet(self, worksheet):
+        return self._spreadsheet().worksheet(worksheet)
+
+    def apply(self, batch):
+        with self._ws_lock(batch.worksheet):
+            if batch.empty:
+                return
+            with span("sheets.patch", worksheet=batch.worksheet, updates=len(batch.updates),
+                      appends=len(batch.appends), deletes=len(batch.deletes)):
+                try:
+                    _push_batch(self._worksheet(batch.worksheet), batch)
+                except (StaleWriteError, DuplicateKeyError):
+                    # cache เราเห็นแถวนั้นเป็นของเก่า (หรือยังไม่เห็นแถวที่มีอยู่แล้ว) -> ทิ้งไปโหลดใหม่ตอน rerun
+                    self._entries.pop(batch.worksheet, None)
+                    raise
+            entry = self._entries.get(batch.worksheet)
+            old_version = entry['version'] if entry is not None else None
+            previous, version = self.bump_version(batch.worksheet)
+            version = version or f"local:{time.time_ns()}"
+            if entry is not None and previous is not None and previous != old_version:
+                # มีคนอื่นเขียนก่อนหน้าที่ cache เรายังไม่เห็น -> ทิ้ง cache ไปโหลดใหม่
+                self._entries.pop(batch.worksheet, None)
+                entry, old_version = None, None
+            if entry is not None:
+                # patch ของใน cache เลย ไม่ต้องโหลดทั้ง sheet ใหม่
+                entry['df'] = batch.apply_to(entry['df'])
+                entry['version'] = version
+                entry['checked_at'] = time.monotonic()
+        self._notify(batch.worksheet, batch, old_version, version)
+
+
+# --- 💾 SQLite (WAL + connection pool + index) ---
+class SQLiteBackend(Backend):
+    """เก็บร้านไว้ในไฟล์ SQLite บนเครื่อง เร็วกว่า Sheets มากและใช้ offline ได้
+
+    หน้าเว็บที่ต้องกรอง (ของว่าง, ตาม category, ของที่ขายแล้ว, ช่วงวันที่ของประวัติ) จะ query ด้วย SQL ตรงๆ
+    แทนการโหลดทั้งตารางมากรองใน pandas
+    """
+
+    name = "sqlite"
+    INDEXES = {
+        'idx_products_status': 'products(status)',
+        'idx_products_category': 'products(category)',
+        'idx_products_sold_date': 'products(sold_date)',
+        'idx_transactions_date': 'transactions(date)',
+    }
+
+    def __init__(self, path, pool_size=4):
+        super().__init__()
+        self.path = path
+        self._pool = queue.LifoQueue(maxsize=pool_size)
+        with self.connect() as db:
+            self._init_schema(db)
+
+    def _open(self):
+        db = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    @contextmanager
+    def connect(self):
+        try:
+            db = self._pool.get_nowait()
+        except queue.Empty:
+            db = self._open()
+        try:
+            yield db
+        finally:
+            try:
+                self._pool.put_nowait(db)
+            except queue.Full:
+                db.close()
+
+    def _init_schema(self, db):
+        with db:
+            db.execute("CREATE TABLE IF NOT EXISTS products (product_id TEXT PRIMARY KEY)")
+            db.execute("CREATE TABLE IF NOT EXISTS transactions (id INTEGER PRIMARY KEY AUTOINCREMENT)")
+            # ไฟล์ .db เก่าไม่มีบางคอลัมน์ (category, image_base64) -> เติมให้
+            for table, cols in COLUMNS.items():
+                for col in cols:
+                    self._add_column(db, table, col)
+            db.execute("UPDATE products SET category = 'Uncategorized' WHERE category IS NULL")
+            db.execute("CREATE TABLE IF NOT EXISTS _meta (name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+            for name, target in self.INDEXES.items():
+                db.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+
+    def _table_columns(self, db, table):
+        return [r[1] for r in db.execute(f"PRAGMA table_info({table})")]
+
+    def _add_column(self, db, table, col):
+        if col not in self._table_columns(db, table):
+            kind = {'money': 'REAL', 'version': 'INTEGER'}.get(SCHEMA.get(table, {}).get(col), 'TEXT')
+            db.execute(f"ALTER TABLE {table} ADD COLUMN {_quote(col)} {kind}")
+
+    def _select(self, sql, params=()):
+        with span("sqlite.query", sql=sql) as sp, self.connect() as db:
+            df = pd.read_sql_query(sql, db, params=params)
+            if sp.enabled:
+                sp.set(rows=len(df), bytes=_payload_size(df))
+            return df
+
+    def _version(self, db, table):
+        row = db.execute("SELECT version FROM _meta WHERE name = ?", (table,)).fetchone()
+        return row[0] if row else 0
+
+    def _bump(self, db, table):
+        db.execute("INSERT INTO _meta (name, version) VALUES (?, 1) "
+                   "ON CONFLICT(name) DO UPDATE SET version = version + 1", (table,))
+        return self._version(db, table)
+
+    def version(self, worksheet):
+        with self.connect() as db:
+            return self._version(db, worksheet)
+
+    def durable_version(self, worksheet):
+        return self.version(worksheet)  # เก็บอยู่ในตาราง _meta ของไฟล์ .db
+
+    def read(self, worksheet, columns=None):
+        columns = COLUMNS[worksheet] if columns is None else columns
+        cols = ", ".join(_quote(c) for c in columns)
+        order = "id" if worksheet == 'transactions' else "rowid"
+        return coerce(self._select(f"SELECT {cols} FROM {worksheet} ORDER BY {order}"), worksheet, columns)
+
+    def write(self, df, worksheet):
+        with span("sqlite.write", worksheet=worksheet, rows=len(df)), self.connect() as db, db:
+            db.execute(f"DELETE FROM {worksheet}")
+            self._insert(db, worksheet, dump(df, worksheet).to_dict('records'), replace=True)
+            self._bump(db, worksheet)
+        self._notify(worksheet, None, None, None)
+
+    def _insert(self, db, table, rows, replace=False):
+        # replace ใช้เฉพาะตอน write ทั้งตาราง (ลบของเดิมไปแล้ว) append ปกติห้ามทับแถวที่มี id เดียวกัน
+        verb = "INSERT OR REPLACE" if replace else "INSERT"
+        for row in rows:
+            row = {k: v for k, v in row.items() if k != 'id'}
+            for col in row:
+                self._add_column(db, table, col)
+            cols = ", ".join(_quote(c) for c in row)
+            marks = ", ".join("?" for _ in row)
+            try:
+                db.execute(f"{verb} INTO {table} ({cols}) VALUES ({marks})", [_sql_value(v) for v in row.values()])
+            except sqlite3.IntegrityError:
+                # rollback ทั้ง batch (อยู่ใน `with db`) -> ของเดิมไม่ถูกแตะ
+                raise DuplicateKeyError(table, [str(row.get(UNIQUE_KEYS.get(table, 'id')))]) from None
+
+    def apply(self, batch):
+        if batch.empty:
+            return
+        table, key = batch.worksheet, batch.key
+        with span("sqlite.apply", worksheet=table, updates=len(batch.updates),
+                  appends=len(batch.appends), deletes=len(batch.deletes)), self.connect() as db, db:
+            if batch.versioned:
+                # ล็อกการเขียนตั้งแต่ตอนอ่าน version -> ไม่มีใครแทรกระหว่างเช็คกับเขียน (ผิด = rollback ทั้ง batch)
+                db.execute("BEGIN IMMEDIATE")
+                batch.stamp(self._row_versions(db, table, key, list(batch.updates)))
+            old_version = self._version(db, table)
+            for row_id, values in batch.updates.items():
+                for col in values:
+                    self._add_column(db, table, col)
+                sets = ", ".join(f"{_quote(c)} = ?" for c in values)
+                db.execute(f"UPDATE {table} SET {sets} WHERE {_quote(key)} = ?",
+                           [_sql_value(v) for v in values.values()] + [row_id])
+            if batch.deletes:
+                marks = ", ".join("?" for _ in batch.deletes)
+                db.execute(f"DELETE FROM {table} WHERE {_quote(key)} IN ({marks})", batch.deletes)
+            self._insert(db, table, batch.appends)
+            version = self._bump(db, table)
+        self._notify(table, batch, old_version, version)
+
+    def _row_versions(self, db, table, key, ids):
+        if not ids:
+            return {}
+        marks = ", ".join("?" for _ in ids)
+        rows = db.execute(f"SELECT {_quote(key)}, COALESCE({_quote(ROW_VERSION)}, 0) FROM {table} "
+                          f"WHERE {_quote(key)} IN ({marks})", ids)
+        return {str(row_id): int(version) for row_id, version in rows}
+
+    # --- page queries (push down ไปที่ SQL) ---
+    def available_items(self, category=None, columns=None):
+        columns = COLUMNS['products'] if columns is None else columns
+        cols = ", ".join(_quote(c) for c in columns)
+        sql = f"SELECT {cols} FROM products WHERE status = 'Available'"
+        params = []
+        if category is not None:
+            sql += " AND category = ?"
+            params.append(category)
+        return coerce(self._select(sql + " ORDER BY rowid", params), 'products', columns)
+
+    def sold_items(self, columns=None):
+        columns = COLUMNS['products'] if columns is None else columns
+        cols = ", ".join(_quote(c) for c in columns)
+        df = self._select(f"SELECT {cols} FROM products WHERE status = 'Sold' ORDER BY sold_date DESC")
+        return coerce(df, 'products', columns)
+
+    def between(self, worksheet, column, start=None, end=None, status=None, columns=None):
+        # วันที่เก็บเป็นข้อความ ISO -> เทียบแบบ string ได้ และใช้ index ของ date/sold_date
+        columns = COLUMNS[worksheet] if columns is None else columns
+        cols = ", ".join(_quote(c) for c in columns)
+        sql, params = f"SELECT {cols} FROM {worksheet} WHERE {_quote(column)} IS NOT NULL AND {_quote(column)} != ''", []
+        if start is not None:
+            sql += f" AND {_quote(column)} >= ?"
+            params.append(str(start))
+        if end is not None:
+            sql += f" AND {_quote(column)} < ?"
+            params.append(str(end))
+        if status is not None:
+            sql += " AND status = ?"
+            params.append(status)
+        return coerce(self._select(sql, params), worksheet, columns)
+
+
+def _payload_size(df):
+    # ขนาดข้อมูลใน RAM (รวม string) -- คิดเฉพาะตอนเปิด profiler เพราะต้องไล่ทุก cell
+    return int(df.memory_usage(index=False, deep=True).sum()) if df is not None else 0
+
+
+def _quote(name):
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def _sql_value(value):
+    value = _cell(value)
+    return None if value == "" else value
+
+
+class RowBatch:
+    """รวมการแก้หลายอย่างในหนึ่ง interaction แล้วส่งทีเดียวตอน commit
+
+    ใช้แบบ `with backend.batch("products") as b: b.update(pid, {...}, expect=row.row_version)`
+    update ซ้ำ id เดิมจะถูกรวมเป็นก้อนเดียว
+
+    worksheet ที่มี row_version: backend เช็ค expect กับ version ปัจจุบันของแถวก่อนเขียน (compare-and-set)
+    ถ้าไม่ตรง -> StaleWriteError และไม่เขียนอะไรทั้ง batch, ถ้าตรง -> ทุกแถวที่แก้ได้ version + 1
+    """
+
+    def __init__(self, backend, worksheet, key='product_id'):
+        self.backend = backend
+        self.worksheet = worksheet
+        self.key = key
+        self.updates = {}   # id -> {col: value}
+        self.appends = []   # [row dict]
+        self.deletes = []   # [id]
+        self.expected = {}  # id -> row_version ที่คนแก้เห็นตอนเปิดฟอร์ม
+
+    @property
+    def versioned(self):
+        return ROW_VERSION in COLUMNS.get(self.worksheet, [])
+
+    @property
+    def empty(self):
+        return not (self.updates or self.appends or self.deletes)
+
+    @property
+    def unique_key(self):
+        return UNIQUE_KEYS.get(self.worksheet)
+
+    def append(self, row):
+        row = dict(row)
+        if self.unique_key:
+            self.check_new([r.get(self.unique_key) for r in self.appends], [row])
+        if ENTRY_ID in COLUMNS.get(self.worksheet, []) and not row.get(ENTRY_ID):
+            # id คงที่ตั้งแต่สร้าง -> journal ส่งซ้ำกี่รอบก็เป็นแถวเดิม (ขึ้นต้นด้วยตัวอักษร ไม่ให้ sheet เดาเป็นตัวเลข)
+            row[ENTRY_ID] = f"e{uuid.uuid4().hex[:16]}"
+        self.appends.append(row)
+
+    def check_new(self, existing, rows=None):
+        """append ห้ามใช้ unique key ที่มีอยู่แล้ว (existing = ค่าในคอลัมน์นั้นของ backend) -> DuplicateKeyError
+
+        แถวที่ batch นี้ลบก่อนเพิ่มกลับเข้าไปใหม่ไม่นับว่าซ้ำ (rows = append ที่จะเช็ค, default = ทั้งหมด)
+        """
+        key = self.unique_key
+        if not key:
+            return
+        taken = {str(v) for v in existing if _cell(v) != ""} - set(self.deletes)
+        duplicates = [str(r.get(key)) for r in (self.appends if rows is None else rows) if str(r.get(key)) in taken]
+        if duplicates:
+            raise DuplicateKeyError(self.worksheet, duplicates)
+
+    def update(self, row_id, values, expect=None):
+        row_id = str(row_id)
+        for row in reversed(self.appends):
+            if str(row.get(self.key)) == row_id:
+                row.update(values)  # แถวที่เพิ่งเพิ่มใน batch เดียวกัน -> แก้ที่ตัว append เลย
+                return
+        self.updates.setdefault(row_id, {}).update(values)
+        if expect is not None:
+            self.expected.setdefault(row_id, int(expect))
+
+    def stamp(self, current):
+        """compare-and-set: current = {id: row_version ปัจจุบันใน backend} ของแถวที่จะแก้
+
+        backend เรียกตอนถือ lock ของการเขียนอยู่ -> เช็ค expect แล้วใส่ version ใหม่ลงใน updates/appends
+        (update ที่ระบุ row_version มาเองแล้ว เช่นรายการจาก journal ของ write-behind จะไม่ถูกแก้)
+        """
+        stale = {row_id: current.get(row_id) for row_id, expect in self.expected.items()
+                 if current.get(row_id) != expect}
+        if stale:
+            raise StaleWriteError(self.worksheet, stale)
+        for row_id, values in self.updates.items():
+            if row_id in current:
+                values.setdefault(ROW_VERSION, current[row_id] + 1)
+        for row in self.appends:
+            row.setdefault(ROW_VERSION, 1)
+
+    def delete(self, row_id):
+        row_id = str(row_id)
+        self.updates.pop(row_id, None)
+        self.appends = [r for r in self.appends if str(r.get(self.key)) != row_id]
+        if row_id not in self.deletes:
+            self.deletes.append(row_id)
+
+    def merge(self, other):
+        """รวม batch ที่มาทีหลังเข้ามา (ใช้ตอนรวมหลายรายการในคิวให้เป็น request เดียว)"""
+        for row_id, values in other.updates.items():
+            self.update(row_id, values)
+        for row_id in other.deletes:
+            self.delete(row_id)
+        for row in other.appends:
+            self.append(row)
+        return self
+
+    def commit(self):
+        self.backend.apply(self)
+        self.updates, self.appends, self.deletes, self.expected = {}, [], [], {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+
+    def apply_to(self, df):
+        df = df.copy()
+        if self.updates:
+            ids = df[self.key].astype(str)
+            for row_id, values in self.updates.items():
+                mask = ids == row_id
+                for col, val in values.items():
+                    if col not in df.columns:
+                        df[col] = None
+                    elif df[col].dtype != object:
+                        df[col] = df[col].astype(object)  # categorical/datetime รับค่าใหม่ตรงๆ ไม่ได้
+                    df.loc[mask, col] = val
+        if self.deletes:
+            df = df[~df[self.key].astype(str).isin(self.deletes)]
+        if self.appends:
+            df = pd.concat([df, pd.DataFrame(self.appends)], ignore_index=True)
+        return coerce(df, self.worksheet, list(df.columns))
+
+    def versions_in(self, df):
+        """row_version ปัจจุบันของแถวใน updates จาก DataFrame ที่มีทั้ง worksheet (ใช้กับ stamp)"""
+        rows = df[df[self.key].astype(str).isin(list(self.updates))]
+        versions = rows[ROW_VERSION] if ROW_VERSION in rows.columns else pd.Series(0, index=rows.index)
+        return dict(zip(rows[self.key].astype(str), versions.astype(int)))
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    try:
+        if pd.isna(value):
+            return ""
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, 'item'):
+        value = value.item()  # numpy -> python
+    return value
+
+
+def _push_batch(ws, batch):
+    """ส่ง batch ขึ้น Google Sheets: values 1 request, append 1 request, delete 1 request"""
+    from gspread.utils import rowcol_to_a1
+
+    header = ws.row_values(1)
+    if batch.updates or batch.deletes:
+        key_col = header.index(batch.key) + 1
+        # อ่านแค่คอลัมน์ id เพื่อหาเลขแถวจริงใน sheet (แถว 1 = header)
+        row_of = {str(v): i + 1 for i, v in enumerate(ws.col_values(key_col)) if i > 0}
+    if batch.versioned:
+        # version ปัจจุบันบน sheet ของแถวที่จะแก้ (sheet เก่าที่ยังไม่มีคอลัมน์ = 0 ทุกแถว)
+        # Sheets ไม่มี transaction: กันชนกันได้ระหว่าง session ใน process นี้ (ถือ lock ของ worksheet อยู่)
+        # ส่วนระหว่างเครื่องที่รันแยก process จะเหลือช่องว่างแค่ช่วงระหว่างอ่านกับเขียนรอบนี้
+        current = {row_id: 0 for row_id in batch.updates if row_id in row_of}
+        if batch.updates and ROW_VERSION in header:
+            values = ws.col_values(header.index(ROW_VERSION) + 1)
+            for row_id in current:
+                cell = values[row_of[row_id] - 1] if row_of[row_id] <= len(values) else ""
+                current[row_id] = int(pd.to_numeric(cell, errors='coerce') or 0) if str(cell).strip() else 0
+        batch.stamp(current)
+
+    appends = batch.appends
+    if appends and ENTRY_ID in header:
+        # append ที่ลง sheet ไปแล้ว (retry หลัง response หาย) -> ข้าม ไม่ให้แถวเบิ้ล
+        sent = {str(v) for v in ws.col_values(header.index(ENTRY_ID) + 1)[1:] if str(v).strip()}
+        appends = [r for r in appends if str(r.get(ENTRY_ID)) not in sent]
+    if appends and batch.unique_key in header:
+        # ที่เหลือเป็นแถวใหม่จริง -> id ซ้ำกับของบน sheet = ปฏิเสธก่อนเขียนอะไรลงไป
+        batch.check_new(ws.col_values(header.index(batch.unique_key) + 1)[1:], appends)
+
+    data = []
+    # คอลัมน์ใหม่ (เช่น listed_date ใน sheet เก่า) -> เติม header ก่อน ไปพร้อม request เดียวกับ values
+    for col in [c for values in list(batch.updates.values()) + appends for c in values]:
+        if col not in header:
+            header.append(col)
+            data.append({'range': rowcol_to_a1(1, len(header)), 'values': [[col]]})
+
+    for row_id, values in batch.updates.items():
+        if row_id not in row_of:
+            continue
+        for col, val in values.items():
+            a1 = rowcol_to_a1(row_of[row_id], header.index(col) + 1)
+            data.append({'range': a1, 'values': [[_cell(val)]]})
+    if data:
+        ws.batch_update(data, value_input_option='USER_ENTERED')
+
+    if appends:
+        rows = [[_cell(r.get(col)) for col in header] for r in appends]
+        ws.append_rows(rows, value_input_option='USER_ENTERED')
+
+    if batch.deletes:
+        # ลบจากล่างขึ้นบนเพื่อไม่ให้เลขแถวเลื่อน
+        rows = sorted((row_of[i] for i in batch.deletes if i in row_of), reverse=True)
+        requests = [{'deleteDimension': {'range': {
+            'sheetId': ws.id, 'dimension': 'ROWS', 'startIndex': r - 1, 'endIndex': r}}} for r in rows]
+        if requests:
+            ws.spreadsheet.batch_update({'requests': requests})
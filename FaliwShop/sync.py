@@ -0,0 +1,225 @@
+import json
+import sqlite3
+import threading
+import time
+
+from schema import project
+from storage import Backend, RowBatch, _cell
+
+
+def _plain(value):
+    value = _cell(value)
+    return None if value == "" else value
+
+
+def _dump_batch(batch):
+    return json.dumps({
+        'key': batch.key,
+        'updates': {k: {c: _plain(v) for c, v in vals.items()} for k, vals in batch.updates.items()},
+        'appends': [{c: _plain(v) for c, v in row.items()} for row in batch.appends],
+        'deletes': list(batch.deletes),
+    }, ensure_ascii=False, default=str)
+
+
+def _load_batch(backend, worksheet, payload):
+    data = json.loads(payload)
+    batch = RowBatch(backend, worksheet, data['key'])
+    batch.updates, batch.appends, batch.deletes = data['updates'], data['appends'], data['deletes']
+    return batch
+
+
+# --- 🔄 Write-behind: journal บนเครื่อง + sync ขึ้น Google Sheets ใน background ---
+class WriteBehindBackend(Backend):
+    """ครอบ SheetsBackend: การเขียนทุกครั้งลง journal (SQLite) แล้วตอบกลับทันที
+
+    apply ไม่เรียก Sheets เลย (ใช้ view ในเครื่อง) ส่วน read ถ้าติดต่อ Sheets ไม่ได้จะใช้ view ล่าสุดแทน
+    worker thread จะรวมรายการที่ค้างในคิวเป็น batch เดียวต่อ worksheet แล้วส่งขึ้น Sheets
+    ถ้าส่งไม่ผ่านจะลองใหม่แบบ backoff (2, 4, 8, ... วินาที สูงสุด max_backoff)
+    journal_path ต้องอยู่บน disk ถาวร: รายการใน journal จะไม่หายแม้ container restart -> เปิดแอปใหม่ก็ sync ต่อ
+    (ไฟล์ในโฟลเดอร์แอปของ container ฟรีถูกล้างทุกครั้งที่ restart ขายแล้วยังไม่ sync = หาย)
+
+    ข้อมูลที่หน้าเว็บอ่าน = ของบน Sheets + รายการที่ยังค้างในคิว
+    compare-and-set ของ row_version เช็คกับข้อมูลชุดนี้ตอน apply (ตอน flush ขึ้น Sheets ไม่เช็คซ้ำ)
+    """
+
+    name = "sheets"
+
+    def __init__(self, inner, journal_path, flush_interval=2.0, max_backoff=300):
+        super().__init__()
+        self.inner = inner
+        self.flush_interval = flush_interval
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()        # views / versions / journal connection
+        self._flush_lock = threading.Lock()  # ห้าม rebuild view ระหว่างกำลัง flush
+        self._views = {}        # worksheet -> DataFrame (Sheets + คิว)
+        self._inner_seen = {}   # worksheet -> version ของ Sheets ที่ view นี้รวมไว้แล้ว
+        self._epoch = {}        # worksheet -> เพิ่มเมื่อมีคนอื่นแก้ Sheets
+        self._local = {}        # worksheet -> จำนวนครั้งที่เขียนจากเครื่องนี้
+
+        self._db = sqlite3.connect(journal_path, timeout=10, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")  # commit แล้วต้องอยู่บน disk จริง
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pending ("
+            " seq INTEGER PRIMARY KEY AUTOINCREMENT, worksheet TEXT NOT NULL, payload TEXT NOT NULL,"
+            " created_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_try REAL NOT NULL DEFAULT 0, last_error TEXT)")
+
+        inner.subscribe(self._on_inner_write)
+        self._wake = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="sheets-sync", daemon=True)
+        self._worker.start()
+
+    # --- journal ---
+    def _pending_rows(self, worksheet=None):
+        with self._lock:
+            sql = "SELECT seq, worksheet, payload, attempts, next_try FROM pending"
+            if worksheet is None:
+                return self._db.execute(sql + " ORDER BY seq").fetchall()
+            return self._db.execute(sql + " WHERE worksheet = ? ORDER BY seq", (worksheet,)).fetchall()
+
+    def pending_count(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def last_error(self):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT last_error FROM pending WHERE last_error IS NOT NULL ORDER BY seq LIMIT 1").fetchone()
+            return row[0] if row else None
+
+    # --- view / version ---
+    def _token(self, worksheet):
+        return f"{self._epoch.get(worksheet, 0)}.{self._local.get(worksheet, 0)}"
+
+    def _view(self, worksheet):
+        try:
+            inner_version = self.inner.version(worksheet)
+            with self._lock:
+                if worksheet in self._views and self._inner_seen.get(worksheet) == inner_version:
+                    return self._views[worksheet], self._token(worksheet)
+            return self._rebuild(worksheet)
+        except Exception:
+            # ติดต่อ Sheets ไม่ได้ (offline) -> ใช้ view ล่าสุดไปก่อน (ยังไม่เคยโหลดเลยก็ต้อง error)
+            with self._lock:
+                if worksheet not in self._views:
+                    raise
+                return self._views[worksheet], self._token(worksheet)
+
+    def _rebuild(self, worksheet):
+        # Sheets เปลี่ยนจากที่อื่น (หรือยังไม่เคยโหลด) -> โหลดใหม่แล้วทับด้วยรายการที่ค้างในคิว
+        with self._flush_lock:
+            df = self.inner.read(worksheet)
+            inner_version = self.inner.version(worksheet)
+            with self._lock:  # apply ที่เข้ามาระหว่างนี้ต้องรอ -> ไม่มีรายการไหนหลุดจาก view ใหม่
+                for (payload,) in self._db.execute(
+                        "SELECT payload FROM pending WHERE worksheet = ? ORDER BY seq", (worksheet,)):
+                    df = _load_batch(self, worksheet, payload).apply_to(df)
+                self._views[worksheet] = df
+                self._inner_seen[worksheet] = inner_version
+                self._epoch[worksheet] = self._epoch.get(worksheet, 0) + 1
+                return df, self._token(worksheet)
+
+    def read(self, worksheet, columns=None):
+        return project(self._view(worksheet)[0], columns).copy()
+
+    def version(self, worksheet):
+        return self._view(worksheet)[1]  # {epoch}.{local} ใช้ได้แค่ใน process นี้
+
+    def durable_version(self, worksheet):
+        # version ของ Sheets ที่ view รวมไว้ + รายการล่าสุดใน journal (seq ไม่ถูกใช้ซ้ำ)
+        self._view(worksheet)
+        with self._lock:
+            seen = self._inner_seen.get(worksheet)
+            if seen is None or str(seen).startswith("local:"):
+                return None
+            last = self._db.execute("SELECT MAX(seq) FROM pending WHERE worksheet = ?", (worksheet,)).fetchone()[0]
+        return f"{seen}+{last or 0}"
+
+    def _on_inner_write(self, worksheet, batch, old_version, new_version):
+        with self._lock:
+            if batch is not None and old_version is not None and old_version == self._inner_seen.get(worksheet):
+                # เป็นการ flush ของเราเอง: view มีข้อมูลนี้อยู่แล้ว แค่จำ version ใหม่ของ Sheets
+                self._inner_seen[worksheet] = new_version
+            else:
+                # ไม่ทิ้ง view (apply ยังต้องใช้ตอน offline) แค่ให้ read รอบหน้าโหลดใหม่
+                self._inner_seen[worksheet] = None
+
+    # --- write ---
+    def apply(self, batch):
+        if batch.empty:
+            return
+        worksheet = batch.worksheet
+        # ไม่แตะ Sheets เลย: เช็ค/ลง journal กับ view ล่าสุดที่มีในเครื่อง -> ขายได้แม้เน็ตหลุด
+        while True:
+            with self._lock:
+                view = self._views.get(worksheet)
+                if view is not None or not (batch.versioned or batch.unique_key):
+                    # compare-and-set กับ view (Sheets + คิว) ที่ทุก session ใน process ใช้ร่วมกัน
+                    # ผ่านแล้ว row_version ใหม่อยู่ใน batch -> journal / flush เขียนเลขเดียวกันขึ้น Sheets
+                    if batch.unique_key:
+                        batch.check_new(view[batch.unique_key])  # id ซ้ำต้องรู้ตอนนี้ ไม่ใช่ตอน flush
+                    if batch.versioned:
+                        batch.stamp(batch.versions_in(view))
+                    old_version = self._token(worksheet)
+                    self._db.execute("INSERT INTO pending (worksheet, payload, created_at) VALUES (?, ?, ?)",
+                                     (worksheet, _dump_batch(batch), time.time()))
+                    if view is not None:
+                        self._views[worksheet] = batch.apply_to(view)
+                    self._local[worksheet] = self._local.get(worksheet, 0) + 1
+                    new_version = self._token(worksheet)
+                    break
+            self._view(worksheet)  # ยังไม่เคยโหลดเลย -> ต้องรู้ row_version / id ที่มีอยู่ก่อนถึงจะเช็คได้
+        self._notify(worksheet, batch, old_version, new_version)
+        self._wake.set()
+
+    def write(self, df, worksheet):
+        self.flush(force=True)
+        self.inner.write(df, worksheet)
+        with self._lock:
+            self._views.pop(worksheet, None)
+        self._notify(worksheet, None, None, None)
+
+    # --- background sync ---
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                pass  # worker ต้องไม่ตาย รอบหน้าลองใหม่
+
+    def flush(self, force=False):
+        """ส่งรายการที่ถึงเวลาแล้วขึ้น Sheets: 1 batch ต่อ worksheet (เรียงตามลำดับที่เขียน)"""
+        with self._flush_lock:
+            now = time.time()
+            groups = {}
+            for seq, worksheet, payload, attempts, next_try in self._pending_rows():
+                group = groups.setdefault(worksheet, {'rows': [], 'batch': None, 'attempts': attempts})
+                if not group['rows'] and next_try > now and not force:
+                    group['blocked'] = True  # รายการแรกยังอยู่ใน backoff -> รอทั้ง worksheet
+                if group.get('blocked'):
+                    continue
+                batch = _load_batch(self.inner, worksheet, payload)
+                if group['batch'] is not None and group['batch'].key != batch.key:
+                    group['blocked'] = True  # key ต่างกัน -> ส่งรอบหน้า ให้ลำดับยังถูกต้อง
+                    continue
+                group['batch'] = batch if group['batch'] is None else group['batch'].merge(batch)
+                group['rows'].append(seq)
+
+            for worksheet, group in groups.items():
+                if not group['rows']:
+                    continue
+                marks = ", ".join("?" for _ in group['rows'])
+                try:
+                    self.inner.apply(group['batch'])
+                except Exception as e:
+                    delay = min(self.max_backoff, 2 ** (group['attempts'] + 1))
+                    with self._lock:
+                        self._db.execute(
+                            f"UPDATE pending SET attempts = attempts + 1, next_try = ?, last_error = ? WHERE seq IN ({marks})",
+                            [now + delay, f"{type(e).__name__}: {e}"] + group['rows'])
+                    continue
+                with self._lock:
+                    self._db.execute(f"DELETE FROM pending WHERE seq IN ({marks})", group['rows'])
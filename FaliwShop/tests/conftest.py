@@ -0,0 +1,6 @@
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# โมดูลของแอปอยู่ที่ FaliwShop/ ส่วน Sheets ปลอมอยู่ที่ FaliwShop/bench/
+sys.path[:0] = [os.path.dirname(HERE), os.path.join(os.path.dirname(HERE), "bench")]
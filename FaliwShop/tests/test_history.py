@@ -0,0 +1,64 @@
+import pandas as pd
+import pytest
+
+from datagen import make_products, make_transactions
+from fake_gsheets import FakeGSheetsConnection
+from history import PARQUET, HistoryStore, month_bounds
+from storage import SheetsBackend
+from sync import WriteBehindBackend
+
+pytestmark = pytest.mark.skipif(not PARQUET, reason="ต้องมี pyarrow")
+
+
+@pytest.fixture
+def conn():
+    return FakeGSheetsConnection({'products': make_products(30, images='none'),
+                                  'transactions': make_transactions(50),
+                                  '_meta': pd.DataFrame(columns=['worksheet', 'version'])})
+
+
+def _process(conn, tmp_path):
+    # เหมือนเปิดแอปใหม่: backend / history ใหม่ แต่ใช้ journal กับโฟลเดอร์ history เดิม
+    backend = WriteBehindBackend(SheetsBackend(conn, "test", ttl=0), str(tmp_path / "journal.db"),
+                                 flush_interval=3600)
+    return backend, HistoryStore(str(tmp_path / "history"))
+
+
+def _closed_month_row(conn, history):
+    df = conn.sheets['transactions']
+    closed = history._closed()
+    return df[df['date'].str[:7] <= closed].index[0]
+
+
+def test_restart_rebuilds_after_sheet_changed(conn, tmp_path):
+    backend, history = _process(conn, tmp_path)
+    history.sync(backend)
+    i = _closed_month_row(conn, history)
+    day = conn.sheets['transactions'].at[i, 'date']
+    start, after = month_bounds(day[:7])
+    end = after - pd.Timedelta(days=1)  # range / monthly รวมวันสุดท้าย
+
+    # อีกเครื่องแก้แถวในเดือนที่ปิดแล้ว + bump _meta
+    conn.sheets['transactions'].at[i, 'amount'] = 999999.0
+    SheetsBackend(conn, "test").bump_version('transactions')
+
+    backend, history = _process(conn, tmp_path)
+    history.sync(backend)
+    rows = history.range(backend, 'transactions', start, end)
+    assert 999999.0 in rows['amount'].tolist()
+    assert history.monthly(backend, 'transactions', start, end)['rows'].sum() == len(rows)
+    live = history._query(backend, 'transactions', start, after)
+    assert rows['amount'].sum() == pytest.approx(live['amount'].sum())
+    assert history.monthly(backend, 'transactions', start, end)['income'].sum() == pytest.approx(
+        live.loc[live['type'] == 'รายรับ', 'amount'].sum())
+
+
+def test_restart_without_changes_reuses_snapshot(conn, tmp_path, monkeypatch):
+    backend, history = _process(conn, tmp_path)
+    history.sync(backend)
+
+    backend, history = _process(conn, tmp_path)
+    rebuilds = []
+    monkeypatch.setattr(history, '_rebuild', lambda *args: rebuilds.append(args))
+    history.sync(backend)
+    assert rebuilds == []
@@ -0,0 +1,26 @@
+import pytest
+
+from datagen import make_products
+from storage import DuplicateKeyError, SQLiteBackend
+
+
+def test_append_with_existing_id_keeps_sold_row(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / "shop.db"))
+    backend.write(make_products(5, images='none'), 'products')
+    row = backend.read('products').iloc[0]
+    with backend.batch('products') as b:
+        b.update(row.product_id, {'status': 'Sold', 'actual_sold_price': 77.0}, expect=row.row_version)
+    calls = []
+    backend.subscribe(lambda *args: calls.append(args))
+
+    with pytest.raises(DuplicateKeyError) as err:
+        with backend.batch('products') as b:
+            b.append({'product_id': 'NEW01', 'name': 'ok', 'status': 'Available'})
+            b.append({'product_id': row.product_id, 'name': 'clash', 'status': 'Available'})
+    assert err.value.ids == [row.product_id]
+    assert calls == []  # rollback ทั้ง batch -> ไม่มี listener ถูกแจ้ง
+
+    df = backend.read('products').set_index('product_id')
+    assert 'NEW01' not in df.index
+    assert df.loc[row.product_id, ['name', 'status', 'actual_sold_price', 'row_version']].tolist() == \
+        [row['name'], 'Sold', 77.0, row.row_version + 1]
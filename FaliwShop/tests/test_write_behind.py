@@ -0,0 +1,126 @@
+import pytest
+
+from datagen import make_products, make_transactions
+from fake_gsheets import FakeGSheetsConnection
+from storage import DuplicateKeyError, SheetsBackend, StaleWriteError
+from sync import WriteBehindBackend
+
+
+@pytest.fixture
+def conn():
+    return FakeGSheetsConnection({'products': make_products(20, images='none'),
+                                  'transactions': make_transactions(10)})
+
+
+@pytest.fixture
+def backend(conn, tmp_path):
+    # ttl=0 = cache ของ Sheets หมดอายุตลอด (สถานะปกติหลังไม่มีใครใช้ 30 วินาที)
+    return WriteBehindBackend(SheetsBackend(conn, "test", ttl=0), str(tmp_path / "journal.db"),
+                              flush_interval=3600)
+
+
+def _available(backend):
+    df = backend.read('products')
+    return df[df['status'] == 'Available'].iloc[0]
+
+
+def _sheet_row(conn, pid):
+    df = conn.sheets['products']
+    return df[df['product_id'] == pid].iloc[0]
+
+
+def test_sale_while_offline_is_journaled_then_synced(conn, backend):
+    row = _available(backend)
+    conn.offline = True
+    conn.reset_stats()
+    with backend.batch('products') as b:
+        b.update(row.product_id, {'status': 'Sold', 'actual_sold_price': 123.0}, expect=row.row_version)
+    assert conn.stats['calls'] == 0  # apply ไม่แตะ Sheets
+    assert backend.pending_count() == 1
+    # อ่านตอน offline ได้ view ล่าสุด (รวมรายการที่ค้างอยู่)
+    assert backend.read('products').set_index('product_id').loc[row.product_id, 'status'] == 'Sold'
+
+    conn.offline = False
+    backend.flush(force=True)
+    assert backend.pending_count() == 0
+    assert _sheet_row(conn, row.product_id)['status'] == 'Sold'
+    assert float(_sheet_row(conn, row.product_id)['actual_sold_price']) == 123.0
+
+
+def test_stale_write_is_rejected(conn, backend):
+    row = _available(backend)
+    with backend.batch('products') as b:
+        b.update(row.product_id, {'status': 'Sold', 'actual_sold_price': 10.0}, expect=row.row_version)
+    with pytest.raises(StaleWriteError) as err:
+        with backend.batch('products') as b:
+            b.update(row.product_id, {'status': 'Sold', 'actual_sold_price': 99.0}, expect=row.row_version)
+    assert err.value.current == {row.product_id: row.row_version + 1}
+    assert backend.pending_count() == 1  # batch ที่ชนไม่ลง journal
+
+    backend.flush(force=True)
+    assert float(_sheet_row(conn, row.product_id)['actual_sold_price']) == 10.0
+    assert int(_sheet_row(conn, row.product_id)['row_version']) == row.row_version + 1
+
+
+def test_stale_write_on_sheets_backend(conn):
+    sheets = SheetsBackend(conn, "test", ttl=0)
+    row = _available(sheets)
+    with sheets.batch('products') as b:
+        b.update(row.product_id, {'sell_price': 1.0}, expect=row.row_version)
+    with pytest.raises(StaleWriteError):
+        with sheets.batch('products') as b:
+            b.update(row.product_id, {'sell_price': 2.0}, expect=row.row_version)
+    assert float(_sheet_row(conn, row.product_id)['sell_price']) == 1.0
+
+
+def test_retry_after_lost_response_does_not_duplicate(conn, backend, monkeypatch):
+    from fake_gsheets import _FakeWorksheet
+
+    append_rows = _FakeWorksheet.append_rows
+    calls = []
+
+    def flaky(self, rows, value_input_option=None):
+        append_rows(self, rows, value_input_option)  # ลง sheet แล้ว แต่ response หาย
+        calls.append(len(rows))
+        if len(calls) == 1:
+            raise TimeoutError("response lost")
+
+    monkeypatch.setattr(_FakeWorksheet, 'append_rows', flaky)
+    before = len(conn.sheets['transactions'])
+    with backend.batch('transactions', key='date') as b:
+        b.append({'date': '2026-01-02', 'type': 'รายรับ', 'title': 'market', 'amount': 500.0})
+    with backend.batch('products') as b:
+        b.append({'product_id': 'NEW01', 'name': 'new', 'status': 'Available'})
+
+    backend.flush(force=True)  # รอบแรกล้ม (อาจเป็นรอบของ worker) -> retry
+    backend.flush(force=True)
+    assert backend.pending_count() == 0
+    assert len(calls) >= 2
+
+    txns = conn.sheets['transactions']
+    assert len(txns) == before + 1
+    assert (txns['title'] == 'market').sum() == 1
+    assert (conn.sheets['products']['product_id'] == 'NEW01').sum() == 1
+
+
+def test_duplicate_product_id_is_rejected(conn, backend):
+    row = _available(backend)
+    new = {'product_id': row.product_id, 'name': 'other item', 'status': 'Available'}
+    with pytest.raises(DuplicateKeyError) as err:
+        with backend.batch('products') as b:
+            b.append(new)
+    assert err.value.ids == [row.product_id]
+    assert backend.pending_count() == 0
+    with pytest.raises(DuplicateKeyError):
+        with backend.batch('products') as b:
+            b.append({**new, 'product_id': 'NEW01'})
+            b.append({**new, 'product_id': 'NEW01'})
+
+    # Sheets ตรงๆ: id ซ้ำกับของบน sheet -> ไม่เขียนอะไรลงไป
+    sheets = SheetsBackend(conn, "test", ttl=0)
+    before = len(conn.sheets['products'])
+    with pytest.raises(DuplicateKeyError):
+        with sheets.batch('products') as b:
+            b.append(new)
+    assert len(conn.sheets['products']) == before
+    assert _sheet_row(conn, row.product_id)['name'] == row['name']